@@ -8,11 +8,35 @@ def compute_distance(x: np.ndarray, z: np.ndarray) -> np.ndarray:
     """Computes the distance between x and z"""
     return np.linalg.norm(x - z, axis=-1)
 
-def compute_all_distances(x: np.ndarray, z: np.ndarray) -> np.ndarray:
-    """Computes the distance for all k x l sensor/source combinations."""
+def _pair_axes(x: np.ndarray, z: np.ndarray) -> tuple:
+    """Lift sensors x and sources z to broadcastable (1, k, ..., 2) and (l, 1, ..., 2) views."""
     x = x[None,...] if x.ndim == 2 else x
     z = z[None,...] if z.ndim == 2 else z
-    return np.array([compute_distance(x, z) for z in z])
+    nd = max(x.ndim, z.ndim)
+    x = x.reshape(x.shape[:1] + (1,)*(nd - x.ndim) + x.shape[1:])
+    z = z.reshape(z.shape[:1] + (1,)*(nd - z.ndim) + z.shape[1:])
+    return x[None], z[:,None]
+
+def compute_all_distances(x: np.ndarray, z: np.ndarray, out: np.ndarray = None,
+                          dtype: np.dtype = None, squared: bool = False) -> np.ndarray:
+    """Computes the distance for all k x l sensor/source combinations.
+
+    Sensors x are (k, [trials,] steps, d) and sources z are (l, [trials,] steps, d); the
+    result is (l, k, [trials,] steps), written into `out` when given. With `squared`
+    the sqrt is skipped and squared distances are returned.
+    """
+    x, z = _pair_axes(x, z)
+    shape = np.broadcast_shapes(x.shape, z.shape)[:-1]
+    dtype = out.dtype if out is not None else np.dtype(dtype if dtype is not None else np.result_type(x, z, np.float32))
+    out = np.empty(shape, dtype=dtype) if out is None else out
+    tmp = np.empty_like(out) if x.shape[-1] > 1 else None
+    np.subtract(x[...,0], z[...,0], out=out)
+    np.square(out, out=out)
+    for i in range(1, x.shape[-1]):
+        np.subtract(x[...,i], z[...,i], out=tmp)
+        np.square(tmp, out=tmp)
+        out += tmp
+    return out if squared else np.sqrt(out, out=out)
 
 def compute_gradient(x: np.ndarray) -> np.ndarray:
     return partial(np.gradient, axis=-1)(x)
@@ -27,4 +51,4 @@ def _slicer(arr: np.ndarray, n:int, axis: int) -> np.ndarray:
 
 def naive_path_integral(func: Callable, x: np.ndarray) -> np.ndarray:
 
-    return func(swv(x, window_shape=11, axis=-1)[...,::10,:].mean(axis = -1))
\ No newline at end of file
+    return func(swv(x, window_shape=11, axis=-1)[...,::10,:].mean(axis = -1))
\ No newline at end of file
@@ -1,10 +1,12 @@
 import numpy as np
 from numpy.typing import NDArray
-from utils.functional import f_kwargs
+from utils.functional import CallPlan, call_plan, f_kwargs
 from utils.math import compute_all_distances
+from utils.attenuation import ATTENUATIONS, source_params
 from dataclasses import dataclass, field
 from typing import Any, Dict, List, Optional, Protocol, Callable, runtime_checkable, Tuple
-from functools import partial
+from functools import cached_property, partial
+from scipy import stats
 
 @runtime_checkable
 class Identifiable(Protocol):
@@ -18,33 +20,123 @@ class RV:
     func: Callable = field(default_factory = lambda x: x)
     params: Dict[str, Any] = field(default_factory=dict)
     
+def _norm_variates(rng: np.random.Generator, out: NDArray) -> None:
+    rng.standard_normal(out=out)
+
+def _gengamma_variates(rng: np.random.Generator, out: NDArray, a: Any, c: Any) -> None:
+    rng.standard_gamma(a, out=out)
+    np.power(out, 1/np.asarray(c), out=out)
+
+# Standardised (loc 0, scale 1) variates drawn straight from a Generator, the same draws scipy's rvs makes
+DIRECT_VARIATES: Dict[Any, Callable[..., None]] = {stats.norm: _norm_variates, stats.gengamma: _gengamma_variates}
+
 @dataclass
 class StatsRV(RV):
+    """A scipy.stats distribution with fixed `params`.
+
+    The distribution is frozen once and its moments computed once; `params` are not meant to
+    change afterwards (make a new StatsRV instead). Draws from a Generator go straight through
+    it for the families in `DIRECT_VARIATES`, scaled in place, and through the frozen
+    distribution otherwise.
+    """
+    @cached_property
+    def frozen(self) -> Any:
+        return self.func(**self.params)
+
+    @cached_property
+    def _standard(self) -> Tuple[Dict[str, Any], Any, Any]:
+        """Shape parameters, loc and scale."""
+        params = dict(self.params)
+        loc, scale = params.pop('loc', 0.0), params.pop('scale', 1.0)
+        return params, loc, scale
+
+    @cached_property
+    def _moments(self) -> Tuple[Any, Any]:
+        mean, var = self.frozen.stats('mv')
+        return mean[()], var[()]
+
     def mean(self):
-        return self.func(**self.params).mean()
-    
-    def sample(self, n:int|Tuple[int]):
-        return self.func(**self.params).rvs(size=n)
+        return self._moments[0]
+
+    def var(self):
+        return self._moments[1]
+
+    def _fill(self, out: NDArray, rng: np.random.Generator) -> NDArray:
+        """Standardised draws from `rng` written into `out`, drawn in float64 whatever its dtype."""
+        if out.dtype != np.float64:
+            out[...] = self._fill(np.empty(out.shape), rng)
+            return out
+        shape_params = self._standard[0]
+        if self.func in DIRECT_VARIATES:
+            DIRECT_VARIATES[self.func](rng, out, **shape_params)
+        else:
+            out[...] = self.func(**shape_params).rvs(size=out.shape, random_state=rng)
+        return out
+
+    def sample(self, n:int|Tuple[int], random_state: Optional[np.random.Generator] = None):
+        if not isinstance(random_state, np.random.Generator):
+            return self.frozen.rvs(size=n, random_state=random_state)
+        _, loc, scale = self._standard
+        out = self._fill(np.empty(n), random_state)
+        out *= scale
+        out += loc
+        return out
+
+    def sample_trials(self, n:int|Tuple[int], rngs: List[np.random.Generator], out: Optional[NDArray] = None) -> NDArray:
+        """One draw of size n per Generator, on a leading trial axis of `out` (allocated if not given).
+
+        Each trial's standardised draws are written straight into its row and `loc`/`scale`
+        applied in place afterwards, so they may be arrays broadcasting against (trials, *n).
+        A float32 `out` holds the float64 draws rounded, so the streams match a float64 run.
+        """
+        n = (n,) if np.isscalar(n) else tuple(n)
+        out = np.empty((len(rngs),) + n) if out is None else out
+        for row, rng in zip(out, rngs):
+            self._fill(row, rng)
+        _, loc, scale = self._standard
+        out *= scale
+        out += loc
+        return out
 
 @dataclass
 class Dilution:
+    """Attenuation model `func` (or its name in ATTENUATIONS) with its parameters.
+
+    A parameter may hold one value per source (see `source_params`), so a single call
+    attenuates every source with its own strength, scale, ...
+    """
     id: str = None
     func: Callable = field(default_factory = lambda x: x)
     params: Dict[str, Any] = field(default_factory=dict)
     curried: Callable = field(init=False)
 
     def __post_init__(self):
+        self.func = ATTENUATIONS.resolve(self.func)
         self.curried = partial(self.func, **self.params)
 
+    def attenuate(self, d: NDArray, rows: Any = None) -> NDArray:
+        """Attenuation of (sources, ...) distances, or of the distances of sources `rows` when given."""
+        return self.func(d, **source_params(self.params, d.ndim, rows))
+
 
 @dataclass
 class Position:
     func: Callable[..., NDArray]
     params: Dict[str, Any]
+    role: str = 'sensor'
+    # objects described, their per-object params repeated from a single row if need be;
+    # by default as many as the per-object params give
+    count: Optional[int] = None
     curried: Callable[..., NDArray] = field(init=False)
+    plan: CallPlan = field(init=False, repr=False, compare=False)
 
     def __post_init__(self) -> Callable[..., NDArray]:
         self.curried =  partial(self.func, **self.params)
+        self.plan = call_plan(self.curried)
+
+    def path(self, context: Dict[str, Any]) -> NDArray:
+        """Positions given the experiment's fields, of which only those `func` takes are passed."""
+        return self.plan(context)
 
 @dataclass
 class Sensor:
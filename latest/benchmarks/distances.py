@@ -0,0 +1,34 @@
+"""Benchmark the broadcast compute_all_distances against the per-source loop it replaced.
+
+Run from latest/: python -m benchmarks.distances
+"""
+import timeit
+import numpy as np
+from utils.math import compute_all_distances, compute_distance
+
+def loop_all_distances(x: np.ndarray, z: np.ndarray) -> np.ndarray:
+    """Reference implementation: one Python iteration per source."""
+    x = x[None,...] if x.ndim == 2 else x
+    z = z[None,...] if z.ndim == 2 else z
+    return np.array([compute_distance(x, z) for z in z])
+
+def bench(sensors: int, sources: int, steps: int, repeat: int = 3) -> dict:
+    rng = np.random.default_rng(0)
+    x = rng.uniform(0, 100, (sensors, steps, 2))
+    z = rng.uniform(0, 100, (sources, steps, 2))
+    out64 = np.empty((sources, sensors, steps))
+    out32 = np.empty((sources, sensors, steps), dtype=np.float32)
+    np.testing.assert_allclose(compute_all_distances(x, z), loop_all_distances(x, z))
+    cases = {
+        'loop': lambda: loop_all_distances(x, z),
+        'broadcast': lambda: compute_all_distances(x, z, out=out64),
+        'broadcast_f32': lambda: compute_all_distances(x, z, out=out32),
+        'broadcast_sq': lambda: compute_all_distances(x, z, out=out64, squared=True),
+    }
+    return {k: min(timeit.repeat(f, number=1, repeat=repeat)) for k, f in cases.items()}
+
+if __name__ == '__main__':
+    for sensors, sources, steps in [(2, 1, 1201), (50, 50, 1201), (200, 200, 1201)]:
+        times = bench(sensors, sources, steps)
+        print(f"sensors={sensors:4d} sources={sources:4d} steps={steps}: "
+              + ", ".join(f"{k}={v*1e3:.2f}ms" for k, v in times.items()))
@@ -0,0 +1,63 @@
+"""Validate float32 runs against float64: error of every output, and the time and memory saved.
+
+Both runs draw from the same streams (float32 only rounds the float64 draws), so the
+differences are precision alone. Errors are relative to the largest magnitude of each output.
+
+Run from latest/: python -m benchmarks.precision
+"""
+from typing import Any, Callable, Dict
+import numpy as np
+
+from benchmarks.suite import DEFAULTS, Size, _builder, measure
+from experiment import Experiment
+from utils.spatial import SparseDistances
+
+OUTPUTS = (('observed', 'readings'), ('observed', 'locations'), ('latent', 'ev_source'),
+           ('latent', 'distances'), ('latent', 'signal_s'), ('latent', 'signal_b'))
+
+# Largest relative error accepted from a float32 run
+TOLERANCE = 1e-5
+
+def _build(size: Size, dtype: str) -> Experiment:
+    builder = _builder(size)
+    builder.timing_config['dtype'] = dtype
+    return builder.build_experiment()
+
+def _run(size: Size, dtype: str, **settings: Any) -> Experiment:
+    exp = _build(size, dtype)
+    for name, value in settings.items():
+        setattr(exp, name, value)
+    exp.run()
+    return exp
+
+def _output(exp: Experiment, group: str, name: str) -> np.ndarray:
+    value = getattr(getattr(exp, group), name)
+    return value.todense() if isinstance(value, SparseDistances) else np.asarray(value)
+
+def compare(size: Size, **settings: Any) -> Dict[str, float]:
+    """Relative max error of each float32 output against the float64 run."""
+    exact, single = _run(size, 'float64', **settings), _run(size, 'float32', **settings)
+    errors = {}
+    for group, name in OUTPUTS:
+        a, b = _output(exact, group, name), _output(single, group, name)
+        if b.dtype != np.float32:
+            raise TypeError(f"{group}.{name} is {b.dtype} in a float32 run")
+        errors[name] = float(np.max(np.abs(b - a))/max(np.max(np.abs(a)), np.finfo(np.float64).tiny))
+    return errors
+
+def _run_call(size: Size, dtype: str) -> Callable[[], Any]:
+    """Fresh experiment's run, for `measure`."""
+    return _build(size, dtype).run
+
+
+if __name__ == '__main__':
+    modes = {'default': {}, 'memory_budget': {'memory_budget': 2**20}, 'cutoff': {'cutoff': 40.0},
+             'approximate': {'mode': 'approximate'}}
+    for mode, settings in modes.items():
+        errors = compare(DEFAULTS, **settings)
+        worst = max(errors.values())
+        print(f"{mode:14s} {'ok' if worst < TOLERANCE else 'FAIL'}  " + ", ".join(f"{k}={v:.1e}" for k, v in errors.items()))
+    for dtype in ('float64', 'float32'):
+        size = {**DEFAULTS, 'trials': 200}
+        t, peak = measure(lambda: _run_call(size, dtype))
+        print(f"{dtype}: run {t*1e3:.1f}ms, peak {peak/2**20:.1f}MiB ({size})")
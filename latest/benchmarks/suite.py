@@ -0,0 +1,232 @@
+"""Benchmark suite for the simulation hot paths: time, peak memory and scaling exponents.
+
+Every case is timed at a default size and then along each of the axes it depends on (sensors,
+sources, trials, hz, length), varying one axis at a time. The slope of log time (and log peak
+memory) against log axis value is reported as the scaling exponent, so an accidental
+O(n^2) shows up as an exponent near 2 whatever the machine.
+
+Run from latest/:
+
+    python -m benchmarks.suite                    # all cases, compared with benchmarks/baselines.json
+    python -m benchmarks.suite motion distances   # only cases whose names start with these
+    python -m benchmarks.suite --quick            # two sizes per axis
+    python -m benchmarks.suite --save             # record the results as the new baselines
+
+A case regresses when its time at any size exceeds the baseline by more than `--tolerance`
+(times only compare on the machine that recorded the baselines, and are best recorded and
+checked with full runs, as small cases run faster after large ones have warmed the allocator),
+its peak memory grows by more than the same factor, or a scaling exponent grows by more than
+0.25. The exit status is 1 if anything regressed.
+"""
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+import numpy as np
+
+import toy
+import utils.motion as motion
+from base import StatsRV
+from builder import ExperimentBuilder
+from utils.attenuation import exponential, inv_sql, source_params
+from utils.functional import call_plan
+from utils.math import compute_all_distances, naive_path_integral
+
+BASELINES = Path(__file__).with_name('baselines.json')
+
+# Size every case runs at, and the values each axis is swept over
+DEFAULTS = {'sensors': 16, 'sources': 8, 'trials': 50, 'hz': 10, 'length': 120}
+AXES = {'sensors': [16, 64, 256], 'sources': [8, 32, 128], 'trials': [50, 200, 800],
+        'hz': [10, 20, 40], 'length': [120, 240, 480]}
+
+# Allowed growth of a scaling exponent over its baseline
+EXPONENT_TOLERANCE = 0.25
+
+Size = Dict[str, int]
+
+@dataclass
+class Case:
+    """A benchmark: `make(size)` prepares fresh inputs (untimed) and returns the call to time."""
+    name: str
+    make: Callable[[Size], Callable[[], Any]]
+    axes: Tuple[str, ...]
+
+
+def _steps(size: Size) -> int:
+    return int(size['length']*size['hz'])
+
+def _positions(n: int, steps: int) -> np.ndarray:
+    return np.random.default_rng(n).uniform(0, 100, (n, steps + 1, 2))
+
+def _motion(func: Callable, params: Callable[[int], Dict[str, Any]]) -> Callable[[Size], Callable[[], Any]]:
+    def make(size: Size) -> Callable[[], Any]:
+        n = size['sensors']
+        context = {**params(n), 'dt': 1/size['hz'], 'steps': _steps(size), 'trials': size['trials'],
+                   'rng': np.random.default_rng(0)}
+        return lambda: call_plan(func)(context)
+    return make
+
+def _distances(size: Size) -> Callable[[], Any]:
+    x, z = _positions(size['sensors'], _steps(size)), _positions(size['sources'], _steps(size))
+    return lambda: compute_all_distances(x, z)
+
+def _path_integral(size: Size) -> Callable[[], Any]:
+    d = compute_all_distances(_positions(size['sensors'], _steps(size)), _positions(size['sources'], _steps(size)))
+    return lambda: naive_path_integral(inv_sql, d, size['hz'])
+
+def _attenuation(func: Callable, in_place: bool = False) -> Callable[[Size], Callable[[], Any]]:
+    def make(size: Size) -> Callable[[], Any]:
+        d = np.random.default_rng(0).uniform(0, 100, (size['sources'], size['sensors'], _steps(size) + 1))
+        out = np.empty_like(d) if in_place else None
+        return lambda: func(d, strength=10, scale=7, out=out)
+    return make
+
+def _per_source_attenuation(size: Size) -> Callable[[], Any]:
+    """inv_sql with a different strength and scale for every source, in one call."""
+    rng = np.random.default_rng(0)
+    d = rng.uniform(0, 100, (size['sources'], size['sensors'], _steps(size) + 1))
+    params = source_params({'strength': rng.uniform(5, 15, size['sources']), 'scale': rng.uniform(5, 10, size['sources'])}, d.ndim)
+    return lambda: inv_sql(d, **params)
+
+def _sample(size: Size) -> Callable[[], Any]:
+    rv = StatsRV('toy', toy.background['distr'], toy.background['params'])
+    shape = (size['trials'], size['sensors'], _steps(size)//size['hz'])
+    return lambda: rv.sample(shape, np.random.default_rng(0))
+
+def _builder(size: Size) -> ExperimentBuilder:
+    """ExperimentBuilder over the toy problem scaled to `size`."""
+    rng = np.random.default_rng(0)
+    n, m = size['sensors'], size['sources']
+    builder = ExperimentBuilder()
+    builder.add_timings({**toy.timing_config, 'length': size['length'], 'hz': size['hz'],
+                         'trials': size['trials'], 'seed': 0})
+    builder.add_sensor_config({**toy.sensor_config, 'count': n,
+                               'position_args': {'start': rng.uniform(0, 50, (n, 2)), 'velocity': rng.uniform(1, 2, n),
+                                                 'angle': rng.uniform(0, 2*np.pi, n)}})
+    builder.add_source_config({**toy.source_config, 'count': m,
+                               'position_args': {'start': rng.uniform(0, 50, (m, 2))}})
+    return builder
+
+def _build(size: Size) -> Callable[[], Any]:
+    builder = _builder(size)
+    return builder.build_experiment
+
+def _run(size: Size) -> Callable[[], Any]:
+    exp = _builder(size).build_experiment()
+    return exp.run
+
+
+CASES = [
+    Case('motion.linear', _motion(motion.linear, lambda n: {'start': np.zeros((n, 2)), 'velocity': np.ones(n),
+                                                          'angle': np.zeros(n)}), ('sensors', 'hz', 'length')),
+    Case('motion.elliptical', _motion(motion.elliptical, lambda n: {'center': np.zeros((n, 2)), 'periods': np.ones(n),
+                                                                  'a': np.ones(n), 'b': np.ones(n), 'phi': np.zeros(n)}),
+         ('sensors', 'hz', 'length')),
+    Case('motion.stationary', _motion(motion.stationary, lambda n: {'start': np.zeros((n, 2))}), ('sensors', 'hz', 'length')),
+    Case('motion.random_walk', _motion(motion.random_walk, lambda n: {'start': np.zeros((n, 2)), 'mu': np.zeros((n, 2)),
+                                                                    'sigma': np.tile(np.eye(2), (n, 1, 1))}),
+         ('sensors', 'trials', 'hz', 'length')),
+    Case('distances', _distances, ('sensors', 'sources', 'hz', 'length')),
+    Case('naive_path_integral', _path_integral, ('sensors', 'sources', 'hz', 'length')),
+    Case('attenuation.inv_sql', _attenuation(inv_sql), ('sensors', 'sources', 'hz', 'length')),
+    Case('attenuation.exponential', _attenuation(exponential), ('sensors', 'sources', 'hz', 'length')),
+    Case('attenuation.inv_sql.out', _attenuation(inv_sql, in_place=True), ('sensors', 'sources', 'hz', 'length')),
+    Case('attenuation.exponential.out', _attenuation(exponential, in_place=True), ('sensors', 'sources', 'hz', 'length')),
+    Case('attenuation.per_source', _per_source_attenuation, ('sensors', 'sources', 'hz', 'length')),
+    Case('statsrv.sample', _sample, ('sensors', 'trials', 'length')),
+    Case('builder.build_experiment', _build, ('sensors', 'sources')),
+    Case('experiment.run', _run, ('sensors', 'sources', 'trials', 'hz', 'length')),
+]
+
+
+def measure(make: Callable[[], Callable[[], Any]], repeat: int = 3) -> Tuple[float, int]:
+    """Best wall time over `repeat` fresh calls after a warm-up, and the peak bytes allocated by one more under tracemalloc."""
+    make()()
+    best = np.inf
+    for _ in range(repeat):
+        f = make()
+        t = time.perf_counter()
+        f()
+        best = min(best, time.perf_counter() - t)
+    f = make()
+    tracemalloc.start()
+    try:
+        f()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return best, peak
+
+def exponent(values: Sequence[float], measured: Sequence[float]) -> float:
+    """Slope of log measured against log values."""
+    return float(np.polyfit(np.log(values), np.log(np.maximum(measured, 1e-12)), 1)[0])
+
+def run_case(case: Case, quick: bool = False, repeat: int = 3) -> Dict[str, Any]:
+    """Time and peak memory along each axis of `case`, with their scaling exponents."""
+    result = {}
+    for axis in case.axes:
+        values = AXES[axis][:2] if quick else AXES[axis]
+        times, peaks = zip(*(measure(lambda: case.make({**DEFAULTS, axis: v}), repeat) for v in values))
+        result[axis] = {'values': values, 'time': list(times), 'peak': list(peaks),
+                        'time_exponent': exponent(values, times), 'memory_exponent': exponent(values, peaks)}
+    return result
+
+def compare(name: str, result: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Regressions of `result` against the baseline of the same case."""
+    problems = []
+    for axis, now in result.items():
+        then = baseline.get(axis)
+        if then is None:
+            continue
+        for v, t, p in zip(now['values'], now['time'], now['peak']):
+            if v not in then['values']:
+                continue
+            i = then['values'].index(v)
+            if t > tolerance*then['time'][i]:
+                problems.append(f"{name} {axis}={v}: {t*1e3:.2f}ms vs {then['time'][i]*1e3:.2f}ms")
+            if p > tolerance*then['peak'][i] and p - then['peak'][i] > 2**20:
+                problems.append(f"{name} {axis}={v}: peak {p/2**20:.1f}MiB vs {then['peak'][i]/2**20:.1f}MiB")
+        for key in ('time_exponent', 'memory_exponent'):
+            # exponents fitted over other sizes (e.g. --quick) are not comparable
+            if now['values'] == then['values'] and now[key] > then[key] + EXPONENT_TOLERANCE:
+                problems.append(f"{name} {axis}: {key} {now[key]:.2f} vs {then[key]:.2f}")
+    return problems
+
+def report(name: str, result: Dict[str, Any]) -> None:
+    for axis, r in result.items():
+        cells = ", ".join(f"{v}: {t*1e3:.2f}ms/{p/2**20:.1f}MiB" for v, t, p in zip(r['values'], r['time'], r['peak']))
+        print(f"{name:26s} {axis:8s} {cells}  [time ~{axis}^{r['time_exponent']:.2f}, memory ~{axis}^{r['memory_exponent']:.2f}]")
+
+
+def main(argv: Sequence[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('cases', nargs='*', help='prefixes of the case names to run (all by default)')
+    parser.add_argument('--quick', action='store_true', help='two sizes per axis')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--save', action='store_true', help='store the results as the baselines')
+    parser.add_argument('--tolerance', type=float, default=2.0, help='allowed time and memory ratio over the baselines')
+    args = parser.parse_args(argv)
+
+    baselines = json.loads(BASELINES.read_text()) if BASELINES.exists() else {}
+    results, problems = {}, []
+    for case in CASES:
+        if args.cases and not any(case.name.startswith(c) for c in args.cases):
+            continue
+        results[case.name] = run_case(case, args.quick, args.repeat)
+        report(case.name, results[case.name])
+        if case.name in baselines:
+            problems += compare(case.name, results[case.name], baselines[case.name], args.tolerance)
+    if args.save:
+        BASELINES.write_text(json.dumps({**baselines, **results}, indent=1))
+        print(f"Saved baselines of {len(results)} cases to {BASELINES}")
+        return 0
+    for p in problems:
+        print('REGRESSION', p)
+    return 1 if problems else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,4 +1,5 @@
 """Builder module for creating Experiment instances from configuration."""
+import inspect
 import numpy as np
 from numpy.typing import NDArray
 from typing import Any, Dict, List, Callable, Optional, Tuple
@@ -7,21 +8,52 @@ from dataclasses import dataclass, field
 import utils.motion as motion
 from base import *
 from experiment import *
+from experiment import _toy_dilution
+from cache import DiskCache
+from profiling import Profiler, span
+from registry import ObjectTable, _pack
+from utils.attenuation import ATTENUATIONS, PARAM_DIMS as ATTENUATION_DIMS
+from utils.dose import _with_defaults
 
-# Registry mapping function names to actual functions
-POSITION_FUNCTIONS = {
-    "Linear": motion.linear,
-    "Stationary": motion.stationary,
-    "Elliptical": motion.elliptical,
-    "RandomWalk": motion.random_walk
-}
+# Registry mapping function names to actual functions ("Linear", "RandomWalk", "random_walk", ...)
+POSITION_FUNCTIONS = motion.MOTION_MODELS
 
 def get_position_func(func_name: str) -> Callable[..., NDArray]:
     """Return a position function based on name."""
-    if func_name in POSITION_FUNCTIONS:
-        return POSITION_FUNCTIONS[func_name]
-    else:
-        raise ValueError(f"Unknown position function: {func_name}")
+    return POSITION_FUNCTIONS[func_name]
+
+def get_attenuation_func(func_name: str) -> Callable[..., NDArray]:
+    """Return an attenuation function based on name, including those of installed plugins."""
+    return ATTENUATIONS[func_name]
+
+def _pack_dilution(func: Callable, configs: List[Tuple[Dict[str, Any], int]],
+                   base: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Parameters of `func` for the sources of several (params, count) configs.
+
+    A parameter every config gives the same value stays as given; otherwise it becomes one
+    value per source, each config's value repeated over its sources (or given per source
+    already), so one call of `func` attenuates all of them. Configs leaving a parameter out
+    get its value in `base`, else func's default. Array parameters (the tables of PARAM_DIMS)
+    are shared by all sources and must agree between configs.
+    """
+    defaults = {**_with_defaults(func, {}), **(base or {})}
+    required = [k for k, p in list(inspect.signature(func).parameters.items())[1:]
+                if p.default is p.empty and p.kind not in (p.VAR_POSITIONAL, p.VAR_KEYWORD) and k not in defaults]
+    for name in required:
+        if not all(name in params for params, _ in configs):
+            raise ValueError(f"Dilution {func.__name__} needs parameter {name!r} in every source config")
+    packed = {}
+    for name in dict.fromkeys([*(base or {})] + [k for params, _ in configs for k in params]):
+        values = [params.get(name, defaults.get(name)) for params, _ in configs]
+        dims = ATTENUATION_DIMS.get(name, 0)
+        if all(np.ndim(v) == dims and np.array_equal(v, values[0]) for v in values):
+            packed[name] = values[0]
+        elif dims:
+            raise ValueError(f"Dilution parameter {name!r} differs between source configs; all sources share one "
+                             f"{dims}-dimensional {name!r}")
+        else:
+            packed[name] = np.concatenate([_pack(name, v, count, dims) for v, (_, count) in zip(values, configs)])
+    return packed
 
 
 class ExperimentBuilder:
@@ -32,8 +64,8 @@ class ExperimentBuilder:
         self.sensor_configs: List[Dict[str, Any]] = []
         self.source_configs: List[Dict[str, Any]] = []
         self.positions: List[Position] = []
-        self.sensors: List[Sensor] = []
-        self.sources: List[Source] = []
+        self.sensors = ObjectTable(Sensor)
+        self.sources = ObjectTable(Source)
         self.timing_config: Dict[str, Any] = {}
 
 
@@ -49,83 +81,78 @@ class ExperimentBuilder:
         """Add a source configuration to the builder."""
         self.source_configs.append(config)
 
-    def _build_sensors(self) -> List[Sensor]:
-        """Build sensors from stored configurations."""
-        self.sensors = []
-        
-        for config in self.sensor_configs:
+    def _build_objects(self, configs: List[Dict[str, Any]], table: ObjectTable, role: str) -> None:
+        """Add every object of `configs` to `table` and one Position per config.
+
+        The motion parameters are kept on the positions alone, which the experiment evaluates
+        motion from, so the table only lists the objects and their motions.
+        """
+        entries = []
+        for config in configs:
+            position_func = get_position_func(config.get('position_func', 'Stationary'))
             count = config.get('count', 1)
-            sensor_type = config.get('type', 'simple')
-            position_func_name = config.get('position_func', 'Stationary')
-            position_args = config.get('position_args', {})
-            
-            # Get the position function
-            position_func = get_position_func(position_func_name)
-            self.positions.append(Position(func=position_func, params=position_args))
-            
-            
-            for i in range(count):
-                # Create sensor-specific position arguments
-                sensor_position_args = {}
-                for key, value in position_args.items():
-                    if isinstance(value, list) and len(value) > 0:
-                        # Handle cases where we have a list of parameters for each sensor
-                        if isinstance(value[0], list) and i < len(value):
-                            sensor_position_args[key] = value[i]
-                        elif not isinstance(value[0], list) and len(value) > i:
-                            sensor_position_args[key] = value[i]
-                        else:
-                            sensor_position_args[key] = value[0]
-                    else:
-                        sensor_position_args[key] = value
-        
-                sensor = Sensor(id=f"{sensor_type}_{i}", type_id=sensor_type)
-                self.sensors.append(sensor)
-            
-    def _build_sources(self) -> List[Source]:
+            self.positions.append(Position(func=position_func, params=config.get('position_args', {}), role=role, count=count))
+            entries.append((config.get('type', 'simple'), position_func, {}, count))
+        table.extend(entries)
+
+    def _build_sensors(self) -> ObjectTable:
+        """Build sensors from stored configurations."""
+        self.sensors = ObjectTable(Sensor)
+        self._build_objects(self.sensor_configs, self.sensors, 'sensor')
+        return self.sensors
+
+    def _build_sources(self) -> ObjectTable:
         """Build sources from stored configurations."""
-        
-        for config in self.source_configs:
-            count = config.get('count', 1)
-            source_type = config.get('type', 'simple')
-            position_func_name = config.get('position_func', 'Stationary')
-            position_args = config.get('position_args', {})
-            
-            # Get the position function
-            position_func = get_position_func(position_func_name)
-            self.positions.append(Position(func=position_func, params=position_args))
-            
-            for i in range(count):
-                # Create source-specific position arguments
-                source_position_args = {}
-                for key, value in position_args.items():
-                    if isinstance(value, list) and len(value) > 0:
-                        # Handle cases where we have a list of parameters for each source
-                        if isinstance(value[0], list) and i < len(value):
-                            source_position_args[key] = value[i]
-                        elif not isinstance(value[0], list) and len(value) > i:
-                            source_position_args[key] = value[i]
-                        else:
-                            source_position_args[key] = value[0]
-                    else:
-                        source_position_args[key] = value
-                source = Source(
-                    id=f"{source_type}_{i}",
-                    type_id=source_type,
-                )
-                
-                self.sources.append(source)
-        
-    
-    def build_experiment(self) -> Experiment:
-        """Build experiment from stored configurations."""
+        self.sources = ObjectTable(Source)
+        self._build_objects(self.source_configs, self.sources, 'source')
+        return self.sources
+
+    def _build_dilution(self) -> Optional[Dilution]:
+        """One dilution for all sources, from the 'dilution' (model name) and 'dilution_params' of their configs.
+
+        Every config must use the same model ('inv_sql' if not named); parameters that differ
+        between configs are packed one value per source. Parameters a config leaves out take the
+        experiment's default dilution's when the model is the same. None when no config sets
+        either key, leaving the experiment's default.
+        """
+        configs = [c for c in self.source_configs if 'dilution' in c or 'dilution_params' in c]
+        if not configs:
+            return None
+        funcs = {ATTENUATIONS.resolve(c.get('dilution', 'inv_sql')) for c in self.source_configs}
+        if len(funcs) > 1:
+            raise ValueError(f"Source configs use different dilution models {sorted(f.__name__ for f in funcs)}; "
+                             "all sources are attenuated by one model")
+        func = funcs.pop()
+        default = _toy_dilution()
+        # sources per config as the table registered them, so the packed values line up with its rows
+        counts = np.bincount(self.sources.config_codes, minlength=len(self.source_configs))
+        params = _pack_dilution(func, [(c.get('dilution_params', {}), n) for c, n in zip(self.source_configs, counts)],
+                                default.params if func is default.func else None)
+        return Dilution(ATTENUATIONS.name_of(func) or func.__name__, func, params)
+
+    def build_experiment(self, cache: Optional[DiskCache] = None, profiler: Optional[Profiler] = None) -> Experiment:
+        """Build experiment from stored configurations, its stages cached in `cache` if given.
+
+        The build and, once it runs, the experiment's stages are timed by `profiler` if given.
+        """
+        with span(profiler, 'build_experiment'):
+            return self._build_experiment(cache, profiler)
+
+    def _build_experiment(self, cache: Optional[DiskCache], profiler: Optional[Profiler]) -> Experiment:
         # Extract timing parameters
         length = float(self.timing_config.get('length', 100.0))
         hz = float(self.timing_config.get('hz', 10.0))
         trials = int(self.timing_config.get('trials', 1))
+        seed = self.timing_config.get('seed')
+        dtype = self.timing_config.get('dtype', 'float64')
         
-        self._build_sensors()
-        self._build_sources()
+        self.positions = []
+        with span(profiler, 'build_sensors'):
+            self._build_sensors()
+        with span(profiler, 'build_sources'):
+            self._build_sources()
+        dilution = self._build_dilution()
+        models = {} if dilution is None else {'dilution': dilution}
         
         return Experiment(sensors=self.sensors, 
                           sources=self.sources, 
@@ -133,9 +160,14 @@ class ExperimentBuilder:
                           length=length, 
                           hz=hz, 
                           trials=trials, 
+                          seed=seed,
+                          dtype=dtype,
                           observed = Observed(),
-                          latent = Latent()
+                          latent = Latent(),
+                          cache = cache,
+                          profiler = profiler,
+                          **models
                           )
 
         
-        
\ No newline at end of file
+        
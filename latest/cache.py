@@ -0,0 +1,106 @@
+"""Content-addressed disk cache of pipeline stages.
+
+Each entry is one stage's result, stored under a hash of the stage name, the inputs the stage
+depends on and the library version, so identical configurations share results across processes
+and a version bump never serves stale ones.
+"""
+import hashlib
+import json
+import os
+import pickle
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+from utils import __version__
+
+DEFAULT_ROOT = Path(os.environ.get('NOSLEEP_CACHE', Path.home()/'.cache'/'nosleep'))
+DEFAULT_MAX_BYTES = 4*2**30
+
+def stage_key(stage: str, inputs: Dict[str, Any]) -> str:
+    """Stable hash of a stage and its JSON-serialisable inputs."""
+    payload = json.dumps({'version': __version__, 'stage': stage, 'inputs': inputs}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+@dataclass
+class CacheEntry:
+    stage: str
+    key: str
+    size: int
+    last_used: float
+
+
+class DiskCache:
+    """Pickled stage results under `root`, evicted least recently used first beyond `max_bytes`."""
+    def __init__(self, root: Optional[Union[str, os.PathLike]] = None, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.root = Path(root) if root is not None else DEFAULT_ROOT
+        self.max_bytes = max_bytes
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _file(self, stage: str, key: str) -> Path:
+        return self.root/f'{stage}-{key}.pkl'
+
+    def get(self, stage: str, key: str) -> Optional[Any]:
+        """The cached result, or None on a miss. A hit counts as a use for eviction."""
+        file = self._file(stage, key)
+        try:
+            with open(file, 'rb') as f:
+                value = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return None
+        os.utime(file)
+        return value
+
+    def put(self, stage: str, key: str, value: Any) -> None:
+        """Store a result, written to a temporary file first so readers never see it half done."""
+        file = self._file(stage, key)
+        tmp = file.with_suffix(f'.{os.getpid()}.tmp')
+        with open(tmp, 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, file)
+        self.evict()
+
+    def entries(self) -> List[CacheEntry]:
+        """Every entry, least recently used first."""
+        entries = []
+        for file in self.root.glob('*.pkl'):
+            stage, _, key = file.stem.rpartition('-')
+            try:
+                stat = file.stat()
+            except FileNotFoundError:
+                continue
+            entries.append(CacheEntry(stage, key, stat.st_size, stat.st_mtime))
+        return sorted(entries, key=lambda e: e.last_used)
+
+    def size(self) -> int:
+        return sum(e.size for e in self.entries())
+
+    def evict(self, max_bytes: Optional[int] = None) -> int:
+        """Drop least recently used entries until the cache fits in `max_bytes`; returns bytes freed."""
+        limit = self.max_bytes if max_bytes is None else max_bytes
+        entries = self.entries()
+        excess = sum(e.size for e in entries) - limit
+        freed = 0
+        for entry in entries:
+            if freed >= excess:
+                break
+            self._file(entry.stage, entry.key).unlink(missing_ok=True)
+            freed += entry.size
+        return freed
+
+    def clear(self, stage: Optional[str] = None) -> int:
+        """Remove every entry, or those of one stage; returns the number removed."""
+        entries = [e for e in self.entries() if stage is None or e.stage == stage]
+        for entry in entries:
+            self._file(entry.stage, entry.key).unlink(missing_ok=True)
+        return len(entries)
+
+    def describe(self) -> Dict[str, Dict[str, float]]:
+        """Entry count, bytes and most recent use per stage."""
+        summary: Dict[str, Dict[str, float]] = {}
+        for e in self.entries():
+            s = summary.setdefault(e.stage, {'entries': 0, 'bytes': 0, 'last_used': 0.0})
+            s['entries'] += 1
+            s['bytes'] += e.size
+            s['last_used'] = max(s['last_used'], e.last_used)
+        return summary
@@ -1,13 +1,59 @@
-from dataclasses import dataclass, field
-from typing import List, Dict, Any
+import copy
+import hashlib
+from functools import partial
+from dataclasses import asdict, dataclass, field
+from typing import List, Dict, Any, Callable, Iterator, Sequence, Union
 import numpy as np
 from numpy.typing import NDArray
-from numpy.lib.stride_tricks import sliding_window_view as swv
 import scipy.stats as stats
 from base import *
-from utils.functional import f_kwargs 
-from utils.math import compute_all_distances, naive_path_integral, _slicer
+from utils.math import compute_all_distances, interval_steps, path_integral
 from utils.attenuation import inv_sql
+from utils.tiling import tiled_path_integral
+from utils.integrals import ANALYTIC_MOTION, closed_form_path_integral
+from utils.dose import fused_path_integral
+from utils.rng import Seeds
+from utils.spatial import SparseDistances, pairs_within, sparse_path_integral
+from cache import DiskCache, stage_key
+from profiling import Profiler, console_profiler, span
+from registry import ObjectTable, motion_trajectories, positions_table
+from utils.trajectory import ArrayTrajectory, Trajectory, window_blocks
+from utils.workspace import Workspace
+
+# Pipeline inputs that describe objects rather than scalar settings
+_OBJECT_INPUTS = ('sensors', 'sources', 'positions', 'background', 'dilution', 'signal')
+
+def _toy_dilution() -> Dilution:
+    return Dilution('toy', inv_sql, {'strength': 10, 'scale': 7})
+
+def _toy_signal(x: NDArray) -> Dict[str, NDArray]:
+    return {'loc': x, 'scale': .2*x}
+
+# Inputs each cached stage depends on
+_PATH_INPUTS = ('sensors', 'sources', 'positions', 'length', 'hz', 'trials', 'seed', 'trial_start', 'id', 'dtype')
+_DOSE_INPUTS = _PATH_INPUTS + ('interval', 'rule', 'memory_budget', 'cutoff', 'integrator', 'dilution')
+_STAGE_INPUTS = {
+    'trajectories': _PATH_INPUTS,
+    'positions': _PATH_INPUTS,
+    'distances': _PATH_INPUTS,
+    'integrated': _PATH_INPUTS + ('interval', 'rule', 'memory_budget'),
+    'sparse_distances': _PATH_INPUTS + ('cutoff',),
+    'dose': _DOSE_INPUTS,
+    'latent_params': _DOSE_INPUTS + ('mode', 'signal'),
+    'samples': _DOSE_INPUTS + ('mode', 'signal', 'background'),
+}
+
+# Precisions an experiment can store its arrays in; sums and means are accumulated in float64
+DTYPES = ('float64', 'float32')
+
+# Dose integrators: 'auto' takes the closed form where there is one, 'fused' always the fused kernel
+INTEGRATORS = ('auto', 'fused')
+
+# Latent modes: 'exact' averages the attenuation over each interval, 'approximate' attenuates the mean distance
+MODES = ('exact', 'approximate')
+
+# Fields whose reassignment invalidates the cached pipeline stages
+_PIPELINE_INPUTS = tuple(dict.fromkeys(sum(_STAGE_INPUTS.values(), ())))
 
 @dataclass
 class Observed:
@@ -26,8 +72,8 @@ class Latent:
 @dataclass
 class Experiment:
     id:str = None
-    sensors: List[Sensor] = field(default_factory=list)
-    sources: List[Source] = field(default_factory=list)
+    sensors: Sequence[Sensor] = field(default_factory=list)
+    sources: Sequence[Source] = field(default_factory=list)
     positions:List[Position] = field(default_factory=list)
     length: float = field(default=100.0)
     hz: float = field(default=10.0)
@@ -38,33 +84,402 @@ class Experiment:
     observed: Observed = field(default_factory=Observed)
     latent: Latent = field(default_factory=Latent)
     obs_shape: Tuple = field(init=False)
+    verbose: bool = field(default=False)
+    memory_budget: Optional[int] = field(default=None)
+    cutoff: Optional[float] = field(default=None)
+    integrator: str = field(default='auto')
+    interval: float = field(default=1.0)
+    rule: str = field(default='trapezoid')
+    mode: str = field(default='exact')
+    seed: Optional[int] = field(default=None)
+    dtype: str = field(default='float64')
+    trial_start: int = field(default=0)
+    bin_steps: int = field(init=False)
+    background: StatsRV = field(default_factory=lambda: StatsRV('toy', stats.gengamma, dict(a=0.75, c = 2.6, loc=0, scale= 0.4625)))
+    dilution: Dilution = field(default_factory=_toy_dilution)
+    signal: Callable[[NDArray], Dict[str, NDArray]] = field(default=_toy_signal)
+    cache: Optional[DiskCache] = field(default=None, repr=False)
+    profiler: Optional[Profiler] = field(default=None, repr=False)
+    # scratch buffers of the tiled kernels, reused from tile to tile within a stage and released
+    # when the stage finishes, so no budget-sized scratch outlives it
+    workspace: Workspace = field(default_factory=Workspace, repr=False, compare=False)
+    _cache: Dict[str, Any] = field(init=False, repr=False, default_factory=dict)
 
     def __post_init__(self) -> None:
         """Initialize time-related parameters after constructor."""
+        if self.seed is None:
+            self.seed = np.random.SeedSequence().entropy
+        if self.verbose and self.profiler is None:
+            self.profiler = console_profiler()
+        self._init_timing()
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        if name == 'dtype':
+            value = np.dtype(value).name
+            if value not in DTYPES:
+                raise ValueError(f"dtype must be one of {DTYPES}, got {value!r}")
+        if name == 'integrator' and value not in INTEGRATORS:
+            raise ValueError(f"integrator must be one of {INTEGRATORS}, got {value!r}")
+        if name == 'mode' and value not in MODES:
+            raise ValueError(f"mode must be one of {MODES}, got {value!r}")
+        super().__setattr__(name, value)
+        if name in _PIPELINE_INPUTS and '_cache' in self.__dict__:
+            self._init_timing()
+            self.invalidate(*[stage for stage, inputs in _STAGE_INPUTS.items() if name in inputs])
+
+    def _init_timing(self) -> None:
         self.dt = 1.0 / self.hz
         self.steps = int(self.length * self.hz)
         self.time_points = np.linspace(0, self.length, self.steps+1)
-        self.obs_shape = (self.trials, len(self.sensors), int(self.length))
-
-    def run(self) -> List[Dict[str, Any]]:
-        """Run the experiment simulation."""
-        # ... (simulation logic later)
-        pos_map = lambda : [f_kwargs(p.curried, self.__dict__)for p in self.positions][0]
-        dist_map = lambda : compute_all_distances(*(pos_map()))
-    
-        background = StatsRV('toy', stats.gengamma, dict(a=0.75, c = 2.6, loc=0, scale= 0.4625))
-        rv = StatsRV('toy', stats.norm)
-        dl = Dilution('toy', inv_sql, {'strength': 10, 'scale':7})
-        f_param  =  lambda x: {'loc': x, 'scale': .2*x}
-        _distances = lambda : naive_path_integral(lambda x: x, dist_map()) 
-        latent_params = f_param(dl.curried(_distances()))
-        print(dist_map().shape, pos_map().shape)
-        self.latent.distances = _distances()
-        self.latent.ev_source= latent_params['loc']
-        self.latent.ev_background = np.zeros_like(self.latent.distances) + background.mean()
-        self.latent.signal_s= stats.norm(**latent_params).rvs()
-        self.latent.signal_b= background.sample(self.obs_shape)
-        self.observed.locations = _slicer(swv(pos_map(), window_shape = 11, axis = 1), 10,1).mean(axis = -1)
-        self.observed.readings = self.latent.signal_b + self.latent.signal_s
-
-        
\ No newline at end of file
+        self.bin_steps = interval_steps(self.hz, self.interval)
+        self.obs_shape = (self.trials, len(self.sensors), self.steps//self.bin_steps)
+
+    def invalidate(self, *stages: str) -> None:
+        """Drop cached pipeline stages (all of them if none are given).
+
+        Reassigning an input drops the stages that depend on it; call this after mutating
+        `positions` or a model in place.
+        """
+        for stage in stages or list(self._cache):
+            self._cache.pop(stage, None)
+
+    @property
+    def seeds(self) -> Seeds:
+        """RNG streams for this experiment, keyed by stage, object and global trial index."""
+        return Seeds(self.seed, self.id)
+
+    @property
+    def trial_ids(self) -> range:
+        """Global indices of the trials this experiment simulates."""
+        return range(self.trial_start, self.trial_start + self.trials)
+
+    def _stage(self, name: str, compute: Callable[[], Any]) -> Any:
+        """Return the cached result of a pipeline stage, computing it on first use.
+
+        The workspace scratch the stage used is released once it is computed.
+        """
+        if name not in self._cache:
+            with span(self.profiler, name) as s:
+                try:
+                    self._cache[name] = self._cached(name, compute)
+                finally:
+                    self.workspace.clear()
+                s.record(**{name: self._cache[name]})
+        return self._cache[name]
+
+    def _cached(self, name: str, compute: Callable[[], Any]) -> Any:
+        """compute() through the disk cache, keyed on the inputs of stage `name`, if there is one.
+
+        Stages with an input that cannot be described stably (see `_describe`) are not cached.
+        """
+        if self.cache is None:
+            return compute()
+        inputs = self.config(_STAGE_INPUTS[name])
+        if _opaque(inputs):
+            return compute()
+        key = stage_key(name, inputs)
+        value = self.cache.get(name, key)
+        if value is None:
+            value = compute()
+            self.cache.put(name, key, value)
+        return value
+
+    def _motion_table(self) -> ObjectTable:
+        """Rows of every object `positions` describe, which must be as many as there are sensors and
+        sources, named by their ids."""
+        table = positions_table(self.positions)
+        ids = []
+        for code, (role, objects) in enumerate((('sensor', self.sensors), ('source', self.sources))):
+            rows = np.count_nonzero(table.type_codes == code)
+            if rows != len(objects):
+                raise ValueError(f"positions describe {rows} {role}s but the experiment has {len(objects)}")
+            ids.append(objects.ids if isinstance(objects, ObjectTable) else np.array([o.id for o in objects], dtype=str))
+        table.ids = np.concatenate(ids)
+        return table
+
+    def _trajectories(self) -> Tuple[Trajectory, Trajectory]:
+        """Lazy sensor and source paths, one trajectory per motion model, kept in memory only.
+
+        Stochastic motion draws from one stream per (object, checkpoint block, trial), keyed by the
+        object's role and id.
+        """
+        if 'trajectories' not in self._cache:
+            with span(self.profiler, 'trajectories') as s:
+                context = {k: v for k, v in self.__dict__.items() if k != '_cache'}
+                rng = partial(self.seeds.trial_rngs, 'positions', self.trial_ids)
+                paths = motion_trajectories(self._motion_table(), context, self.trials, rng)
+                self._cache['trajectories'] = (paths['sensor'], paths['source'])
+                s.record(trajectories=self._cache['trajectories'])
+        return self._cache['trajectories']
+
+    def _positions(self) -> Tuple[NDArray, NDArray]:
+        """Sensor and source paths in full, shape (objects, [trials,] steps+1, d)."""
+        return self._stage('positions', lambda: tuple(np.asarray(t) for t in self._trajectories()))
+
+    def _distances(self) -> NDArray:
+        """Sensor/source distances at every step, shape (sources, sensors, [trials,] steps+1)."""
+        return self._stage('distances', lambda: compute_all_distances(*self._positions()))
+
+    def _integrated(self) -> NDArray:
+        """Distances averaged over each readout interval.
+
+        With a `memory_budget` (bytes) the distances are walked in tiles, pulling only each tile's
+        steps from the trajectories, and neither they nor the paths are held in full.
+        """
+        if self.memory_budget is not None:
+            return self._stage('integrated', lambda: tiled_path_integral(lambda x: x, *self._trajectories(), self.memory_budget, self.bin_steps, self.rule, self.dtype, self.workspace))
+        return self._stage('integrated', lambda: path_integral(lambda x: x, self._distances(), self.bin_steps, self.rule))
+
+    def _sparse_distances(self) -> SparseDistances:
+        """Only the sensor/source pairs within `cutoff` of each other, at every step."""
+        return self._stage('sparse_distances', lambda: pairs_within(*self._positions(), self.cutoff).map(partial(np.asarray, dtype=self.dtype)))
+
+    def _dose(self, dl: Dilution) -> NDArray:
+        """Mean attenuation over each readout interval, integrated from the per-step attenuation.
+
+        With a `cutoff` only the pruned pairs contribute. Otherwise the 'auto' integrator uses
+        the closed form for linear and stationary paths when the dilution has one, evaluating
+        the paths at bin edges only, and the fused kernel, which also yields the interval-mean
+        distances, in every other case.
+        """
+        def compute():
+            return integrate().astype(self.dtype, copy=False)
+        def integrate():
+            if self.cutoff is not None:
+                sd = self._sparse_distances()
+                return sparse_path_integral(partial(dl.attenuate, rows=sd.source), sd, self.bin_steps, self.rule)
+            if self.integrator == 'auto' and all(p.func in ANALYTIC_MOTION for p in self.positions):
+                edges = np.arange(0, self.steps - self.steps % self.bin_steps + 1, self.bin_steps)
+                x, z = (t.at(edges) for t in self._trajectories())
+                dose = closed_form_path_integral(dl.func, x, z, self.dt*self.bin_steps, dl.params, 1)
+                if dose is not None:
+                    return dose
+            paths = self._trajectories() if self.memory_budget is not None else self._positions()
+            dose, distances = fused_path_integral(dl.func, dl.params, *paths, self.bin_steps, self.rule, self.memory_budget, self.workspace)
+            self._cache.setdefault('integrated', distances.astype(self.dtype, copy=False))
+            return dose
+        return self._stage('dose', compute)
+
+    def _latent_params(self, dl: Dilution, f_param: Callable) -> Dict[str, NDArray]:
+        """Signal parameters from the mean attenuation over each interval.
+
+        The 'approximate' mode attenuates the interval-mean distance instead: one pass fewer for
+        the closed-form cases, but biased low for convex attenuations such as inv_sql.
+        """
+        if self.mode == 'approximate' and self.cutoff is None:
+            return self._stage('latent_params', lambda: f_param(dl.attenuate(self._integrated())))
+        return self._stage('latent_params', lambda: f_param(self._dose(dl)))
+
+    def _sample_signal(self, latent_params: Dict[str, NDArray], block: Optional[int] = None) -> NDArray:
+        """Source signal for every trial, shape (trials, sources, sensors, bins), one stream per trial."""
+        params = {k: np.moveaxis(v, -2, 0) if v.ndim == 4 else v for k, v in latent_params.items()}
+        shape = params['loc'].shape[-3:]
+        out = np.empty((self.trials,) + shape, dtype=self.dtype)
+        return StatsRV('toy', stats.norm, params).sample_trials(shape, self.seeds.trial_rngs('signal', self.trial_ids, obj=block), out)
+
+    @property
+    def stochastic_paths(self) -> bool:
+        """Whether any motion model draws a separate path per trial."""
+        return any(p.plan.accepts('trials') for p in self.positions)
+
+    def _models(self) -> Tuple[StatsRV, Dilution, Callable]:
+        """Background distribution, dilution and source signal parametrisation."""
+        return self.background, self.dilution, self.signal
+
+    def _simulate_latent(self) -> None:
+        """Distances, expected values and observed locations."""
+        with span(self.profiler, 'simulate_latent') as s:
+            background, dl, f_param = self._models()
+            latent_params = self._latent_params(dl, f_param)
+            self.latent.distances = self._sparse_distances() if self.cutoff is not None else self._integrated()
+            self.latent.ev_source= latent_params['loc']
+            self.latent.ev_background = np.full_like(self.latent.ev_source, background.mean())
+            with span(self.profiler, 'locations'):
+                self.observed.locations = self._locations()
+            s.record(ev_source=self.latent.ev_source, sensors=self._trajectories()[0], locations=self.observed.locations)
+
+    def _locations(self) -> NDArray:
+        """Sensor positions averaged over each readout interval, in time blocks under a `memory_budget`."""
+        if self.memory_budget is None:
+            return path_integral(lambda x: x, self._positions()[0], self.bin_steps, self.rule, axis = -2)
+        sensors, _ = self._trajectories()
+        out = np.empty(sensors.shape[:-2] + (self.steps//self.bin_steps, sensors.shape[-1]), dtype=self.dtype)
+        bytes_per_step = np.dtype(self.dtype).itemsize*int(np.prod(sensors.shape[:-2]))*sensors.shape[-1]
+        for b, t in window_blocks(self.steps, self.bin_steps, self.memory_budget, bytes_per_step):
+            out[..., b, :] = path_integral(lambda x: x, sensors.window(t.start, t.stop), self.bin_steps, self.rule, axis = -2)
+        return out
+
+    def _sample(self, block: Optional[int] = None) -> None:
+        """Per-trial draws of the source signal and background, and the resulting readings.
+
+        A streamed `block` draws from its own streams.
+        """
+        background, dl, f_param = self._models()
+        def draw():
+            return (self._sample_signal(self._latent_params(dl, f_param), block),
+                    background.sample_trials(self.obs_shape[1:], self.seeds.trial_rngs('background', self.trial_ids, obj=block),
+                                             np.empty(self.obs_shape, dtype=self.dtype)))
+        with span(self.profiler, 'sample') as s:
+            self.latent.signal_s, self.latent.signal_b = draw() if block is not None else self._cached('samples', draw)
+            # summed over sources in float64 whatever the storage precision
+            readings = self.latent.signal_b + self.latent.signal_s.sum(axis = 1, dtype = np.float64)
+            self.observed.readings = readings.astype(self.dtype, copy=False)
+            s.record(signal_s=self.latent.signal_s, readings=self.observed.readings)
+
+    def config(self, names: Sequence[str] = _PIPELINE_INPUTS) -> Dict[str, Any]:
+        """JSON-serialisable description of the pipeline inputs `names` (all of them by default)."""
+        objects = {
+            'sensors': lambda: _describe_objects(self.sensors),
+            'sources': lambda: _describe_objects(self.sources),
+            'positions': lambda: [{'func': _describe(p.func), 'role': p.role, 'count': p.count, 'params': _jsonable(p.params)} for p in self.positions],
+            'background': lambda: _describe(self.background),
+            'dilution': lambda: _describe(self.dilution),
+            'signal': lambda: _describe(self.signal),
+        }
+        return {name: objects[name]() if name in objects else getattr(self, name) for name in names}
+
+    def _trial_fields(self) -> Dict[Tuple[str, str], Tuple[Tuple[int, ...], int]]:
+        """(group, attribute) -> (full shape, trial axis) of every output that varies by trial."""
+        trials, sensors, bins = self.obs_shape
+        sources = len(self.sources)
+        fields = {
+            ('observed', 'readings'): ((trials, sensors, bins), 0),
+            ('latent', 'signal_b'): ((trials, sensors, bins), 0),
+            ('latent', 'signal_s'): ((trials, sources, sensors, bins), 0),
+        }
+        if self.stochastic_paths:
+            fields[('latent', 'ev_source')] = ((sources, sensors, trials, bins), 2)
+            fields[('latent', 'ev_background')] = ((sources, sensors, trials, bins), 2)
+            fields[('observed', 'locations')] = ((sensors, trials, bins, 2), 1)
+            if self.cutoff is None:
+                fields[('latent', 'distances')] = ((sources, sensors, trials, bins), 2)
+        return fields
+
+    def _trial_chunk(self, start: int, count: int) -> 'Experiment':
+        """Copy simulating `count` trials from global trial `start`.
+
+        Cached stages are shared with the copy unless paths differ per trial.
+        """
+        chunk = copy.copy(self)
+        object.__setattr__(chunk, '_cache', {} if self.stochastic_paths else dict(self._cache))
+        object.__setattr__(chunk, 'trial_start', start)
+        object.__setattr__(chunk, 'trials', count)
+        chunk.observed, chunk.latent = Observed(), Latent()
+        chunk._init_timing()
+        return chunk
+
+    def _time_block(self, steps: int, paths: Tuple[NDArray, NDArray]) -> 'Experiment':
+        """Copy covering `steps` steps whose sensor and source paths are already known."""
+        block = copy.copy(self)
+        object.__setattr__(block, '_cache', {'positions': paths, 'trajectories': tuple(ArrayTrajectory(p) for p in paths)})
+        object.__setattr__(block, 'length', steps*self.dt)
+        object.__setattr__(block, 'cache', None)
+        block.observed, block.latent = Observed(), Latent()
+        block._init_timing()
+        block.steps = steps
+        block.time_points = self.time_points[:steps+1]
+        block.obs_shape = (self.trials, len(self.sensors), steps//self.bin_steps)
+        return block
+
+    def stream(self, block_seconds: float) -> Iterator[Tuple[slice, Observed, Latent]]:
+        """Simulate the run block by block, yielding (time_slice, Observed, Latent) per block.
+
+        time_slice indexes the readout bins covered by the block. Each block's paths are pulled
+        from the lazy trajectories, so memory scales with the block rather than the run length.
+        Only the trajectories are cached on the experiment.
+        """
+        block_bins = interval_steps(1/self.interval, block_seconds)
+        bins = self.steps//self.bin_steps
+        sensors, sources = self._trajectories()
+        for block, b0 in enumerate(range(0, bins, block_bins)):
+            steps = min(block_bins, bins - b0)*self.bin_steps
+            t = (b0*self.bin_steps, b0*self.bin_steps + steps + 1)
+            chunk = self._time_block(steps, (sensors.window(*t), sources.window(*t)))
+            chunk._simulate_latent()
+            chunk._sample(block)
+            yield slice(b0, b0 + steps//self.bin_steps), chunk.observed, chunk.latent
+
+    def run(self, workers: int = 1, trials_per_chunk: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Run the experiment simulation.
+
+        With `workers` > 1 the trials are sharded over a process pool in chunks of
+        `trials_per_chunk` and reassembled into the same `Observed`/`Latent` as a single process.
+        """
+        if workers > 1:
+            from parallel import run_sharded
+            with span(self.profiler, 'run'):
+                return run_sharded(self, workers, trials_per_chunk)
+        with span(self.profiler, 'run'):
+            self._simulate_latent()
+            self._sample()
+
+
+def _jsonable(value: Any) -> Any:
+    """value with arrays, tuples and NumPy scalars turned into plain JSON types."""
+    if isinstance(value, dict):
+        return {str(k): _jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [_jsonable(v) for v in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+def _describe_objects(objects: Sequence[Union[Sensor, Source]]) -> Any:
+    """JSON description of sensors or sources, column by column for an ObjectTable."""
+    if isinstance(objects, ObjectTable):
+        return objects.to_dict()
+    return [asdict(o) for o in objects]
+
+# Description of a value that cannot be described stably; stages depending on it are not cached
+OPAQUE = '<opaque>'
+
+def _opaque(description: Any) -> bool:
+    """Whether a description (e.g. from `config`) contains anything described as OPAQUE."""
+    if isinstance(description, dict):
+        return any(_opaque(v) for v in description.values())
+    if isinstance(description, list):
+        return any(_opaque(v) for v in description)
+    return description == OPAQUE
+
+def _describe_value(value: Any, seen: Tuple[int, ...]) -> Any:
+    """JSON description of a value a function captures or defaults to, OPAQUE if there is none."""
+    if value is None or isinstance(value, (bool, int, float, str, np.generic)):
+        return _jsonable(value)
+    if isinstance(value, dict):
+        return {str(k): _describe_value(v, seen) for k, v in value.items()}
+    if isinstance(value, (list, tuple)) or (isinstance(value, np.ndarray) and value.dtype != object):
+        return [_describe_value(v, seen) for v in value]
+    if callable(value):
+        return _describe(value, seen)
+    return OPAQUE
+
+def _describe(obj: Any, seen: Tuple[int, ...] = ()) -> Any:
+    """JSON description of a model or function, stable across processes.
+
+    Functions are named by module and qualified name; lambdas and nested functions, whose
+    names are not unique, also by a hash of their code and constants and by the values of
+    their defaults and closure, and partials by their function and arguments. Values with no
+    stable description (arbitrary objects) are OPAQUE.
+    """
+    if id(obj) in seen:
+        return OPAQUE
+    seen += (id(obj),)
+    if isinstance(obj, (RV, Dilution)):
+        return {'type': type(obj).__name__, 'id': obj.id, 'func': _describe(obj.func, seen), 'params': _jsonable(obj.params)}
+    if isinstance(obj, (stats.rv_continuous, stats.rv_discrete)):
+        return f'scipy.stats.{obj.name}'
+    if isinstance(obj, partial):
+        return {'partial': _describe(obj.func, seen), 'args': _describe_value(obj.args, seen),
+                'keywords': _describe_value(obj.keywords, seen)}
+    name = f'{getattr(obj, "__module__", None)}.{getattr(obj, "__qualname__", type(obj).__name__)}'
+    code = getattr(obj, '__code__', None)
+    if code is not None and '<' in name:
+        name += ':' + hashlib.sha1(code.co_code + repr(code.co_consts).encode()).hexdigest()[:12]
+        try:
+            closure = [cell.cell_contents for cell in obj.__closure__ or ()]
+        except ValueError:
+            return OPAQUE
+        if obj.__defaults__ or obj.__kwdefaults__ or closure:
+            return {'func': name, 'defaults': _describe_value(obj.__defaults__ or (), seen),
+                    'kwdefaults': _describe_value(obj.__kwdefaults__ or {}, seen), 'closure': _describe_value(closure, seen)}
+    return name
@@ -0,0 +1,71 @@
+"""Process-pool trial sharding for Experiment.run."""
+import sys
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+from multiprocessing import shared_memory
+from typing import Dict, Optional
+
+from experiment import Experiment
+from utils.spatial import SparseDistances, concat_trials
+
+# Experiment shipped to each worker once, by the pool initializer
+_EXPERIMENT: Optional[Experiment] = None
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """Open a block owned by the parent, which alone unlinks it."""
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    return shared_memory.SharedMemory(name=name)
+
+def _init_worker(exp: Experiment) -> None:
+    global _EXPERIMENT
+    _EXPERIMENT = exp
+
+def _run_chunk(offset: int, count: int, specs: Dict) -> Optional[SparseDistances]:
+    """Simulate trials [offset, offset + count) and write them into the shared output blocks."""
+    exp = _EXPERIMENT
+    chunk = exp._trial_chunk(exp.trial_start + offset, count)
+    if exp.stochastic_paths:
+        chunk._simulate_latent()
+    chunk._sample()
+    for (group, name), (block, shape, axis) in specs.items():
+        shm = _attach(block)
+        try:
+            index = [slice(None)]*len(shape)
+            index[axis] = slice(offset, offset + count)
+            np.ndarray(shape, dtype=exp.dtype, buffer=shm.buf)[tuple(index)] = getattr(getattr(chunk, group), name)
+        finally:
+            shm.close()
+    return chunk.latent.distances if exp.stochastic_paths and exp.cutoff is not None else None
+
+def run_sharded(exp: Experiment, workers: int, trials_per_chunk: Optional[int] = None) -> None:
+    """Experiment.run across a process pool, results returned through shared memory.
+
+    Trial-independent stages are computed once here and shipped with the experiment; workers
+    only simulate what differs by trial, each trial from its own RNG streams, so the assembled
+    `Observed`/`Latent` match a single-process run with the same seed.
+    """
+    trials_per_chunk = trials_per_chunk or -(-exp.trials//workers)
+    if not exp.stochastic_paths:
+        exp._simulate_latent()
+    fields = exp._trial_fields()
+    itemsize = np.dtype(exp.dtype).itemsize
+    blocks = {key: shared_memory.SharedMemory(create=True, size=max(8, itemsize*int(np.prod(shape))))
+              for key, (shape, _) in fields.items()}
+    try:
+        specs = {key: (blocks[key].name, shape, axis) for key, (shape, axis) in fields.items()}
+        # spawned rather than forked: forking would copy the parent's compiled-kernel thread pools
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_init_worker, initargs=(exp,)) as pool:
+            offsets = range(0, exp.trials, trials_per_chunk)
+            futures = [pool.submit(_run_chunk, o, min(trials_per_chunk, exp.trials - o), specs) for o in offsets]
+            sparse = [(o, f.result()) for o, f in zip(offsets, futures)]
+        for (group, name), (shape, _) in fields.items():
+            setattr(getattr(exp, group), name, np.ndarray(shape, dtype=exp.dtype, buffer=blocks[(group, name)].buf).copy())
+        if exp.stochastic_paths and exp.cutoff is not None:
+            exp.latent.distances = concat_trials(sparse, exp.trials)
+    finally:
+        for shm in blocks.values():
+            shm.close()
+            shm.unlink()
@@ -0,0 +1,218 @@
+"""Per-stage profiling: named spans with wall/CPU time, memory and output shapes, sent to sinks.
+
+    profiler = Profiler([StatsSink(), ChromeTraceSink('run.json')])
+    exp.profiler = profiler
+    exp.run()
+    profiler.close()                       # writes run.json, viewable in chrome://tracing or Perfetto
+    print(profiler.sinks[0].summary())
+
+Spans nest: a stage computed while another runs is its child. Memory is measured with
+tracemalloc, which the profiler starts on its first span if it is not already tracing; `allocated`
+is the net bytes a span leaves allocated and `peak` the most it had allocated at once (both None
+with `memory=False`, which avoids tracemalloc's overhead). Without a
+profiler every span is the shared `NULL_SPAN`, so instrumented code pays one call per stage.
+Spans recorded inside worker processes (`run(workers=...)`) are not sent back.
+"""
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+@dataclass
+class Span:
+    name: str
+    depth: int = 0
+    start: float = 0.0
+    wall: float = 0.0
+    cpu: float = 0.0
+    allocated: Optional[int] = None
+    peak: Optional[int] = None
+    shapes: Dict[str, Any] = field(default_factory=dict)
+    _base: int = field(default=0, repr=False)
+    _peak: int = field(default=0, repr=False)
+
+    def record(self, **values: Any) -> None:
+        """Note the shape and dtype of arrays (or tuples/dicts of them) produced in the span."""
+        self.shapes.update({k: _shape(v) for k, v in values.items()})
+
+
+def _shape(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {k: _shape(v) for k, v in value.items()}
+    if isinstance(value, (tuple, list)):
+        return [_shape(v) for v in value]
+    shape = getattr(value, 'shape', None)
+    if shape is None:
+        return type(value).__name__
+    dtype = getattr(value, 'dtype', None)
+    return f"{tuple(int(n) for n in shape)}" + (f" {dtype}" if dtype is not None else '')
+
+
+class _NullSpan:
+    """Span of a disabled profiler: a context manager that records nothing."""
+    def __enter__(self) -> '_NullSpan':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        pass
+
+    def record(self, **values: Any) -> None:
+        pass
+
+NULL_SPAN = _NullSpan()
+
+
+class _ActiveSpan:
+    def __init__(self, profiler: 'Profiler', name: str):
+        self.profiler, self.span = profiler, Span(name)
+
+    def __enter__(self) -> Span:
+        self.profiler._open(self.span)
+        return self.span
+
+    def __exit__(self, *exc) -> None:
+        self.profiler._close(self.span)
+
+
+class Profiler:
+    """Times named spans and sends each finished span to every sink."""
+    def __init__(self, sinks: Sequence['Sink'] = (), memory: bool = True):
+        self.sinks = list(sinks)
+        self.memory = memory
+        self.origin = time.perf_counter()
+        self.stack: List[Span] = []
+        self._started_tracing = False
+
+    def span(self, name: str) -> _ActiveSpan:
+        return _ActiveSpan(self, name)
+
+    def _open(self, span: Span) -> None:
+        if self.memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracing = True
+            current, peak = tracemalloc.get_traced_memory()
+            # the peak is reset per span, so hand the peak so far to the enclosing span first
+            if self.stack:
+                self.stack[-1]._peak = max(self.stack[-1]._peak, peak)
+            tracemalloc.reset_peak()
+            span._base = span._peak = current
+        span.depth = len(self.stack)
+        self.stack.append(span)
+        span.cpu = time.process_time()
+        span.start = time.perf_counter()
+
+    def _close(self, span: Span) -> None:
+        span.wall = time.perf_counter() - span.start
+        span.cpu = time.process_time() - span.cpu
+        span.start -= self.origin
+        self.stack.pop()
+        if self.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            span._peak = max(span._peak, peak)
+            span.allocated, span.peak = current - span._base, span._peak - span._base
+            if self.stack:
+                self.stack[-1]._peak = max(self.stack[-1]._peak, span._peak)
+            tracemalloc.reset_peak()
+        for sink in self.sinks:
+            sink.emit(span)
+
+    def close(self) -> None:
+        """Close every sink, and stop tracemalloc if the profiler started it."""
+        for sink in self.sinks:
+            sink.close()
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def __enter__(self) -> 'Profiler':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class Sink(ABC):
+    """Receives every finished span; `close` is called once the profiler is done."""
+    @abstractmethod
+    def emit(self, span: Span) -> None:
+        ...
+
+    def close(self) -> None:
+        pass
+
+
+class LoggingSink(Sink):
+    """One log line per span, indented by nesting depth."""
+    def __init__(self, logger: Union[str, logging.Logger] = 'nosleep.profile', level: int = logging.INFO):
+        self.logger = logging.getLogger(logger) if isinstance(logger, str) else logger
+        self.level = level
+
+    def emit(self, span: Span) -> None:
+        memory = '' if span.peak is None else f' allocated {span.allocated/1024:.1f}KiB peak {span.peak/1024:.1f}KiB'
+        shapes = ''.join(f' {k}={v}' for k, v in span.shapes.items())
+        self.logger.log(self.level, '%s%s: wall %.2fms cpu %.2fms%s%s',
+                        '  '*span.depth, span.name, span.wall*1e3, span.cpu*1e3, memory, shapes)
+
+
+class StatsSink(Sink):
+    """Keeps every span in memory; `totals` aggregates them by name."""
+    def __init__(self):
+        self.spans: List[Span] = []
+
+    def emit(self, span: Span) -> None:
+        self.spans.append(span)
+
+    def totals(self) -> Dict[str, Dict[str, float]]:
+        """name -> count, total wall and CPU seconds, total net bytes allocated and largest peak."""
+        totals: Dict[str, Dict[str, float]] = {}
+        for s in self.spans:
+            t = totals.setdefault(s.name, {'count': 0, 'wall': 0.0, 'cpu': 0.0, 'allocated': 0, 'peak': 0})
+            t['count'] += 1
+            t['wall'] += s.wall
+            t['cpu'] += s.cpu
+            t['allocated'] += s.allocated or 0
+            t['peak'] = max(t['peak'], s.peak or 0)
+        return totals
+
+    def summary(self) -> str:
+        lines = [f"{'span':20s} {'count':>5s} {'wall ms':>10s} {'cpu ms':>10s} {'peak MiB':>9s}"]
+        for name, t in sorted(self.totals().items(), key=lambda kv: -kv[1]['wall']):
+            lines.append(f"{name:20s} {t['count']:5d} {t['wall']*1e3:10.2f} {t['cpu']*1e3:10.2f} {t['peak']/2**20:9.1f}")
+        return '\n'.join(lines)
+
+
+class ChromeTraceSink(Sink):
+    """Collects spans as Chrome trace events, written to `path` on `close`."""
+    def __init__(self, path: Union[str, os.PathLike]):
+        self.path = Path(path)
+        self.events: List[Dict[str, Any]] = []
+
+    def emit(self, span: Span) -> None:
+        self.events.append({'name': span.name, 'cat': 'nosleep', 'ph': 'X', 'ts': span.start*1e6, 'dur': span.wall*1e6,
+                            'pid': os.getpid(), 'tid': threading.get_ident(),
+                            'args': {'cpu_ms': span.cpu*1e3, **({} if span.peak is None else {'allocated': span.allocated, 'peak': span.peak}),
+                                     **span.shapes}})
+
+    def close(self) -> None:
+        self.path.write_text(json.dumps({'traceEvents': self.events, 'displayTimeUnit': 'ms'}))
+
+
+def span(profiler: Optional[Profiler], name: str) -> Union[_ActiveSpan, _NullSpan]:
+    """A span of `profiler`, or the no-op span without one."""
+    return NULL_SPAN if profiler is None else profiler.span(name)
+
+def console_profiler(memory: bool = False) -> Profiler:
+    """Profiler logging every span to stderr, as `Experiment(verbose=True)` uses."""
+    logger = logging.getLogger('nosleep.profile.console')
+    if not logger.handlers:
+        logger.addHandler(logging.StreamHandler())
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+    return Profiler([LoggingSink(logger)], memory=memory)
@@ -0,0 +1,191 @@
+"""Columnar (struct-of-arrays) table of sensors or sources."""
+from functools import partial
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Type, Union
+import numpy as np
+from numpy.typing import NDArray
+
+import utils.motion as motion
+from base import Position, Sensor, Source
+from utils.functional import call_plan, f_kwargs
+from utils.trajectory import AnalyticTrajectory, RandomWalkTrajectory, Trajectory
+
+# Motion models by code, as stored in ObjectTable.motion_codes
+MOTIONS: Tuple[Callable[..., NDArray], ...] = (motion.stationary, motion.linear, motion.elliptical, motion.random_walk)
+
+# Dimensions of one object's value of each per-object motion parameter
+PARAM_DIMS = {'start': 1, 'center': 1, 'mu': 1, 'sigma': 2,
+              'velocity': 0, 'angle': 0, 'periods': 0, 'a': 0, 'b': 0, 'phi': 0}
+
+def _pack(name: str, value: Any, count: int, dims: Optional[int] = None) -> NDArray:
+    """(count, ...) rows of a parameter given for all objects at once or once for every object.
+
+    `dims` is the dimensions of one object's value, by default those PARAM_DIMS gives it.
+    """
+    value = np.asarray(value, dtype=np.float64)
+    dims = PARAM_DIMS.get(name, value.ndim) if dims is None else dims
+    if value.ndim == dims:
+        return np.broadcast_to(value, (count,) + value.shape)
+    if value.ndim == dims + 1 and len(value) in (1, count):
+        return np.broadcast_to(value, (count,) + value.shape[1:])
+    raise ValueError(f"Parameter {name!r} has shape {value.shape}; expected {dims} dimensions per object for {count} objects")
+
+def _count(params: Dict[str, Any]) -> int:
+    """Number of objects a set of motion parameters describes."""
+    counts = [len(v) for name, v in ((n, np.asarray(v)) for n, v in params.items())
+              if name in PARAM_DIMS and v.ndim == PARAM_DIMS[name] + 1]
+    return max(counts, default=1)
+
+def _shared(name: str, column: NDArray) -> Any:
+    """A parameter that is not per object, which must then agree across the rows batched together."""
+    if not (column == column[0]).all():
+        raise ValueError(f"Parameter {name!r} differs between configs of the same motion and cannot be batched")
+    return column[0]
+
+@dataclass
+class ObjectTable(Sequence):
+    """Sensors or sources as columns: one row per object.
+
+    `motion_codes` index `MOTIONS` and `type_codes` index `types`; `params` holds the motion
+    parameters the rows were added with as (rows, ...) arrays, NaN in rows whose motion does not
+    take them. Indexing returns a `Sensor`/`Source` built from the row on access, so nothing is
+    kept per object.
+    """
+    view: Type[Union[Sensor, Source]]
+    ids: NDArray = field(default_factory=lambda: np.array([], dtype=str))
+    type_codes: NDArray = field(default_factory=lambda: np.array([], dtype=np.intp))
+    types: List[str] = field(default_factory=list)
+    motion_codes: NDArray = field(default_factory=lambda: np.array([], dtype=np.intp))
+    config_codes: NDArray = field(default_factory=lambda: np.array([], dtype=np.intp))
+    params: Dict[str, NDArray] = field(default_factory=dict)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __getitem__(self, i: Union[int, slice]) -> Union[Sensor, Source, List[Union[Sensor, Source]]]:
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        return self.view(id=str(self.ids[i]), type_id=self.types[self.type_codes[i]])
+
+    def __iter__(self) -> Iterator[Union[Sensor, Source]]:
+        return (self[i] for i in range(len(self)))
+
+    def append(self, type_id: str, func: Callable[..., NDArray], params: Dict[str, Any], count: int) -> None:
+        """Add `count` objects of one config, their parameters packed into the columns."""
+        self.extend([(type_id, func, params, count)])
+
+    def extend(self, configs: Sequence[Tuple[str, Callable[..., NDArray], Dict[str, Any], int]]) -> None:
+        """Add the objects of several (type_id, motion, params, count) configs, each column concatenated once."""
+        counts = [count for *_, count in configs]
+        rows = [len(self)] + counts
+        for type_id, *_ in configs:
+            if type_id not in self.types:
+                self.types.append(type_id)
+        first = self.config_codes.max(initial=-1) + 1
+        # objects of a type are numbered on from those already in the table, so ids stay unique
+        numbered = {t: int(np.count_nonzero(self.type_codes == self.types.index(t))) for t, *_ in configs}
+        ids = []
+        for t, _, _, n in configs:
+            ids.append(np.char.add(f'{t}_', np.arange(numbered[t], numbered[t] + n).astype(str)))
+            numbered[t] += n
+        self.ids = np.concatenate([self.ids] + ids)
+        self.type_codes = np.concatenate([self.type_codes] + [np.full(n, self.types.index(t)) for t, _, _, n in configs])
+        self.motion_codes = np.concatenate([self.motion_codes] + [np.full(n, MOTIONS.index(f)) for _, f, _, n in configs])
+        self.config_codes = np.concatenate([self.config_codes] + [np.full(n, first + i) for i, n in enumerate(counts)])
+        packed = [{name: _pack(name, value, n) for name, value in params.items()} for _, _, params, n in configs]
+        for name in set(self.params).union(*packed):
+            tail = next(p[name].shape[1:] for p in [{name: self.params.get(name)}] + packed if p.get(name) is not None)
+            pieces = [p.get(name, np.full((n,) + tail, np.nan)) for p, n in zip([self.params] + packed, rows)]
+            self.params[name] = np.concatenate(pieces)
+
+    def motion_groups(self) -> Iterator[Tuple[Callable[..., NDArray], NDArray, Dict[str, NDArray]]]:
+        """(motion function, rows, packed parameters of those rows) for each motion in use."""
+        for code in np.unique(self.motion_codes):
+            rows = np.flatnonzero(self.motion_codes == code)
+            params = {name: column[rows] for name, column in self.params.items() if not np.isnan(column[rows]).all()}
+            yield MOTIONS[code], rows, params
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Columns as JSON-serialisable lists."""
+        return {'ids': self.ids.tolist(), 'types': [self.types[c] for c in self.type_codes],
+                'motions': [MOTIONS[c].__name__ for c in self.motion_codes]}
+
+
+def positions_table(positions: Sequence[Position]) -> ObjectTable:
+    """Every object described by `positions` as rows typed by role, sensors first.
+
+    A position with a `count` gives that many rows, and parameters with neither one row nor
+    one per object raise.
+    """
+    table = ObjectTable(Sensor, types=['sensor', 'source'])
+    table.extend([(role, p.func, p.params, _count(p.params) if p.count is None else p.count)
+                  for role in table.types for p in positions if p.role == role])
+    return table
+
+def _block_rngs(rng: Callable[[Any], Any], keys: List[Tuple[str, str]], j: int) -> Any:
+    """Streams of checkpoint block j for the objects keyed (role, id) in `keys`; None without an rng."""
+    streams = [rng(key + (j,)) for key in keys]
+    return None if any(s is None for s in streams) else streams
+
+class TableTrajectory(Trajectory):
+    """Trajectory of the rows of one type of an ObjectTable, gathered from one trajectory per motion."""
+    def __init__(self, parts: List[Tuple[Trajectory, NDArray, NDArray]], rows: int, trials: int, per_trial: bool,
+                 dtype: np.dtype = np.float64):
+        self.parts, self.dtype = parts, np.dtype(dtype)
+        d = parts[0][0].shape[-1] if parts else 2
+        steps = parts[0][0].steps if parts else 0
+        self.shape = (rows,) + ((trials,) if per_trial else ()) + (steps + 1, d)
+
+    def at(self, t: Sequence[int]) -> NDArray:
+        t = np.asarray(t)
+        out = np.empty(self.shape[:-2] + (len(t), self.shape[-1]), dtype=self.dtype)
+        for trajectory, mask, dest in self.parts:
+            path = trajectory.at(t)
+            if len(self.shape) == 4 and path.ndim == 3:
+                path = path[:, None]
+            source = path if mask.all() else path[mask]
+            if dest[-1] - dest[0] == len(dest) - 1 and (np.diff(dest) == 1).all():
+                out[dest[0]:dest[-1] + 1] = source
+            else:
+                out[dest] = source
+        return out
+
+
+def motion_trajectories(table: ObjectTable, context: Dict[str, Any], trials: int,
+                        rng: Callable[[Any], Any] = lambda key: None) -> Dict[str, TableTrajectory]:
+    """Lazy paths of every row of `table`, one trajectory per motion model, gathered by type.
+
+    Each motion gets its rows' packed parameters and whatever else it takes from `context`
+    (steps, dt, dtype, ...). Random walks draw checkpoint block j of each object from
+    `rng((type, id, j))`, so an object's walk does not depend on which other rows share its
+    motion; ids must then be unique within a type.
+    Returns type -> trajectory of shape (rows, [trials,] steps+1, d), with a trial axis for
+    every type as soon as any motion draws per trial.
+    """
+    per_trial = any(call_plan(MOTIONS[c]).accepts('trials') for c in np.unique(table.motion_codes))
+    rank = np.empty(len(table), dtype=np.intp)
+    for code in range(len(table.types)):
+        rank[table.type_codes == code] = np.arange(np.count_nonzero(table.type_codes == code))
+    parts: Dict[str, List[Tuple[Trajectory, NDArray, NDArray]]] = {t: [] for t in table.types}
+    for func, rows, params in table.motion_groups():
+        args = {name: column if name in PARAM_DIMS else _shared(name, column) for name, column in params.items()}
+        if func is motion.random_walk:
+            keys = [(table.types[table.type_codes[r]], str(table.ids[r])) for r in rows]
+            if len(set(keys)) < len(keys):
+                raise ValueError("Random walks draw from streams keyed by object id, which repeat in "
+                                 f"{sorted({k for k in keys if keys.count(k) > 1})}")
+            trajectory = f_kwargs(RandomWalkTrajectory, {**context, **args, 'rngs': partial(_block_rngs, rng, keys)})
+        else:
+            trajectory = AnalyticTrajectory(func, args, context)
+        for code, t in enumerate(table.types):
+            mask = table.type_codes[rows] == code
+            if mask.any():
+                parts[t].append((trajectory, mask, rank[rows[mask]]))
+    return {t: TableTrajectory(parts[t], np.count_nonzero(table.type_codes == code), trials, per_trial,
+                               context.get('dtype', np.float64))
+            for code, t in enumerate(table.types)}
+
+def evaluate_motion(table: ObjectTable, context: Dict[str, Any], trials: int,
+                    rng: Callable[[Any], Any] = lambda key: None) -> Dict[str, NDArray]:
+    """Full paths of `motion_trajectories`, type -> (rows, [trials,] steps+1, d)."""
+    return {t: np.asarray(trajectory) for t, trajectory in motion_trajectories(table, context, trials, rng).items()}
@@ -0,0 +1,185 @@
+"""Real-time replay of simulated readings to many concurrent subscribers."""
+import asyncio
+import struct
+from dataclasses import dataclass
+from typing import AsyncIterator, Optional, Sequence, Set, Union
+import numpy as np
+from numpy.typing import NDArray
+
+from experiment import Experiment
+
+# Wire header of every frame sent over a socket: index, time, trials, sensors
+HEADER = struct.Struct('<qdII')
+
+# What a subscriber does when its queue is full
+POLICIES = ('block', 'drop')
+
+SensorSelection = Optional[Union[int, slice, Sequence[int]]]
+
+@dataclass(frozen=True)
+class Frame:
+    index: int
+    time: float
+    readings: NDArray
+
+
+class Subscription:
+    """Queue of frame indexes for one subscriber, iterated with `async for`.
+
+    Only indexes are queued; the readings are read-only views of the server's buffer taken
+    when a frame is consumed. Under the 'block' policy a full queue stalls the publisher; under
+    'drop' the oldest frame is discarded and counted in `dropped`. Closing a subscription
+    releases a publisher stalled on it and ends its iteration.
+    """
+    def __init__(self, server: 'ReplayServer', sensors: SensorSelection = None, maxsize: int = 64,
+                 policy: str = 'block'):
+        if policy not in POLICIES:
+            raise ValueError(f"policy must be one of {POLICIES}, got {policy!r}")
+        self.server = server
+        self.sensors = slice(None) if sensors is None else sensors
+        self.policy = policy
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self.dropped = 0
+        self.closed = False
+        self.pending: Optional[asyncio.Future] = None
+
+    def frame(self, index: int) -> Frame:
+        return Frame(index, self.server.time(index), self.server.buffer[index][:, self.sensors])
+
+    def __aiter__(self) -> 'Subscription':
+        return self
+
+    async def __anext__(self) -> Frame:
+        index = await self.queue.get()
+        if index is None:
+            raise StopAsyncIteration
+        return self.frame(index)
+
+    def put(self, index: Optional[int]) -> asyncio.Future:
+        """Queue `index` once there is room, as a future that `close` cancels."""
+        self.pending = asyncio.ensure_future(self.queue.put(index))
+        return self.pending
+
+    def close(self) -> None:
+        """Unsubscribe, dropping queued frames and any put the publisher is waiting on."""
+        if self.closed:
+            return
+        self.closed = True
+        self.server.subscriptions.discard(self)
+        if self.pending is not None:
+            self.pending.cancel()
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+
+class ReplayServer:
+    """Publishes readings bin by bin at wall-clock rate, `speed` times faster.
+
+    `readings` is (trials, sensors, bins), each bin covering `interval` seconds. It is copied once
+    into a read-only (bins, trials, sensors) buffer so every frame is a contiguous view shared by
+    all subscribers, whether in-process (`subscribe`) or over a TCP/Unix socket (`serve`).
+    """
+    def __init__(self, readings: NDArray, interval: float, speed: float = 1.0):
+        self.buffer = np.ascontiguousarray(np.moveaxis(np.asarray(readings, dtype=np.float64), -1, 0))
+        self.buffer.flags.writeable = False
+        self.interval = interval
+        self.speed = speed
+        self.subscriptions: Set[Subscription] = set()
+
+    @classmethod
+    def from_experiment(cls, exp: Experiment, speed: float = 1.0) -> 'ReplayServer':
+        if exp.observed.readings.size == 0:
+            exp.run()
+        return cls(exp.observed.readings, exp.interval, speed)
+
+    @property
+    def frames(self) -> int:
+        return self.buffer.shape[0]
+
+    def time(self, index: int) -> float:
+        """Simulated time at which a bin's reading is complete."""
+        return (index + 1)*self.interval
+
+    def subscribe(self, sensors: SensorSelection = None, maxsize: int = 64, policy: str = 'block') -> Subscription:
+        subscription = Subscription(self, sensors, maxsize, policy)
+        self.subscriptions.add(subscription)
+        return subscription
+
+    async def _publish(self, index: Optional[int]) -> None:
+        """Queue a frame index on every subscription, waiting only on full 'block' queues."""
+        waiting = []
+        for s in list(self.subscriptions):
+            if not s.queue.full():
+                s.queue.put_nowait(index)
+            elif s.policy == 'drop':
+                s.queue.get_nowait()
+                s.dropped += 1
+                s.queue.put_nowait(index)
+            else:
+                waiting.append(s.put(index))
+        if waiting:
+            # a subscription closed meanwhile cancels its put rather than stalling the others
+            await asyncio.gather(*waiting, return_exceptions=True)
+
+    async def run(self, start: int = 0) -> None:
+        """Publish frames from `start` to the end, then signal every subscriber to stop.
+
+        Frames are scheduled against the start time rather than the previous frame, so a stall
+        under backpressure is caught up on instead of accumulating as drift.
+        """
+        loop = asyncio.get_running_loop()
+        t0 = loop.time()
+        for index in range(start, self.frames):
+            delay = t0 + (index - start + 1)*self.interval/self.speed - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await self._publish(index)
+        await self._publish(None)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Stream frames to a socket client after it sends a line of comma-separated sensors (empty for all)."""
+        request = (await reader.readline()).decode().strip()
+        sensors = [int(s) for s in request.split(',')] if request else None
+        subscription = self.subscribe(sensors)
+        try:
+            async for frame in subscription:
+                readings = frame.readings
+                writer.write(HEADER.pack(frame.index, frame.time, *readings.shape))
+                writer.write(memoryview(readings).cast('B') if readings.flags.c_contiguous else readings.tobytes())
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            subscription.close()
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def serve(self, path: Optional[str] = None, host: str = '127.0.0.1', port: int = 0) -> asyncio.AbstractServer:
+        """Listen on a Unix socket at `path`, or on TCP `host`:`port` if no path is given."""
+        if path is not None:
+            return await asyncio.start_unix_server(self._handle, path)
+        return await asyncio.start_server(self._handle, host, port)
+
+
+async def connect(path: Optional[str] = None, host: str = '127.0.0.1', port: int = 0,
+                  sensors: Optional[Sequence[int]] = None) -> AsyncIterator[Frame]:
+    """Client side of `ReplayServer.serve`: yields the frames sent over one connection."""
+    if path is not None:
+        reader, writer = await asyncio.open_unix_connection(path)
+    else:
+        reader, writer = await asyncio.open_connection(host, port)
+    writer.write((','.join(map(str, sensors or ())) + '\n').encode())
+    try:
+        while True:
+            try:
+                index, time, trials, count = HEADER.unpack(await reader.readexactly(HEADER.size))
+            except asyncio.IncompleteReadError:
+                return
+            payload = await reader.readexactly(8*trials*count)
+            yield Frame(index, time, np.frombuffer(payload, dtype=np.float64).reshape(trials, count))
+    finally:
+        writer.close()
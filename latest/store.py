@@ -0,0 +1,157 @@
+"""On-disk result store: a directory of .npy files read back as memory maps.
+
+Layout::
+
+    meta.json                      experiment config, arrays, trials written
+    observed/<attribute>.npy
+    latent/<attribute>.npy
+    latent/distances/<trial>/{source,sensor,step,data}.npy   sparse distances, one chunk per directory
+"""
+import json
+import os
+from dataclasses import fields
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple, Union
+import numpy as np
+from numpy.lib.format import open_memmap
+
+from experiment import Experiment, Observed, Latent
+from utils.spatial import SparseDistances, concat_trials
+
+FORMAT = 1
+
+GROUPS = {'observed': Observed, 'latent': Latent}
+
+_SPARSE_PARTS = ('source', 'sensor', 'step', 'data')
+
+PathLike = Union[str, os.PathLike]
+
+
+class StoreWriter:
+    """Writes an experiment's results into a store as chunks of trials finish.
+
+    Outputs that vary by trial are preallocated as memory-mapped .npy files and filled in place
+    by `write_trials`; `meta.json` is rewritten after every chunk, so a store being written can
+    already be opened and read up to the trials it lists.
+    """
+    def __init__(self, path: PathLike, exp: Experiment):
+        self.path = Path(path)
+        self.fields = exp._trial_fields()
+        self.sparse_trials = exp.stochastic_paths and exp.cutoff is not None
+        self.meta: Dict[str, Any] = {'format': FORMAT, 'experiment': exp.config(), 'arrays': {},
+                                     'sparse': {}, 'trials': [], 'complete': False}
+        for group in GROUPS:
+            (self.path/group).mkdir(parents=True, exist_ok=True)
+        self.arrays = {}
+        for key, (shape, axis) in self.fields.items():
+            self.arrays[key] = open_memmap(self._file(key), mode='w+', dtype=exp.dtype, shape=shape)
+            self.meta['arrays']['/'.join(key)] = {'trial_axis': axis}
+        self._write_meta()
+
+    def _file(self, key: Tuple[str, str]) -> Path:
+        return self.path/key[0]/f'{key[1]}.npy'
+
+    def _write_meta(self) -> None:
+        tmp = self.path/'meta.json.tmp'
+        tmp.write_text(json.dumps(self.meta, indent=1))
+        os.replace(tmp, self.path/'meta.json')
+
+    def _write_sparse(self, key: Tuple[str, str], sd: SparseDistances, offset: int) -> None:
+        chunk = self.path/key[0]/key[1]/str(offset)
+        chunk.mkdir(parents=True, exist_ok=True)
+        for part in _SPARSE_PARTS:
+            np.save(chunk/f'{part}.npy', getattr(sd, part))
+        spec = self.meta['sparse'].setdefault('/'.join(key), {'shape': list(sd.shape), 'chunks': []})
+        spec['chunks'].append(offset)
+
+    def write_static(self, exp: Experiment) -> None:
+        """Write the outputs shared by every trial, once the latent stages have run."""
+        for group in GROUPS:
+            for f in fields(GROUPS[group]):
+                key, value = (group, f.name), getattr(getattr(exp, group), f.name)
+                if key in self.fields or (self.sparse_trials and key == ('latent', 'distances')):
+                    continue
+                if isinstance(value, SparseDistances):
+                    self._write_sparse(key, value, 0)
+                elif np.size(value):
+                    np.save(self._file(key), np.asarray(value))
+                    self.meta['arrays']['/'.join(key)] = {'trial_axis': None}
+        self._write_meta()
+
+    def write_trials(self, offset: int, chunk: Experiment) -> None:
+        """Write the per-trial outputs of `chunk`, whose first trial is trial `offset` of the store."""
+        for key, (shape, axis) in self.fields.items():
+            index = [slice(None)]*len(shape)
+            index[axis] = slice(offset, offset + chunk.trials)
+            self.arrays[key][tuple(index)] = getattr(getattr(chunk, key[0]), key[1])
+            self.arrays[key].flush()
+        if self.sparse_trials:
+            self._write_sparse(('latent', 'distances'), chunk.latent.distances, offset)
+        self.meta['trials'].append([offset, chunk.trials])
+        self._write_meta()
+
+    def close(self) -> None:
+        self.arrays.clear()
+        self.meta['complete'] = True
+        self._write_meta()
+
+    def __enter__(self) -> 'StoreWriter':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def save(exp: Experiment, path: PathLike, trials_per_chunk: Optional[int] = None) -> None:
+    """Write `exp`'s results to a store at `path`.
+
+    An experiment that has already run is written as is. Otherwise it is simulated straight into
+    the store `trials_per_chunk` trials at a time, each chunk written as soon as it finishes, so
+    the full results are never held in memory and are not kept on `exp`.
+    """
+    with StoreWriter(path, exp) as writer:
+        if exp.observed.readings.size:
+            writer.write_static(exp)
+            writer.write_trials(0, exp)
+            return
+        trials_per_chunk = trials_per_chunk or exp.trials
+        if not exp.stochastic_paths:
+            exp._simulate_latent()
+            writer.write_static(exp)
+        for offset in range(0, exp.trials, trials_per_chunk):
+            chunk = exp._trial_chunk(exp.trial_start + offset, min(trials_per_chunk, exp.trials - offset))
+            if exp.stochastic_paths:
+                chunk._simulate_latent()
+            chunk._sample()
+            writer.write_trials(offset, chunk)
+
+
+def _load_sparse(group_dir: Path, name: str, spec: Dict, trials: int, mmap_mode: str) -> SparseDistances:
+    """Sparse distances of a store; chunks written separately are concatenated in memory."""
+    parts = []
+    for offset in spec['chunks']:
+        chunk = group_dir/name/str(offset)
+        arrays = [np.load(chunk/f'{part}.npy', mmap_mode=mmap_mode) for part in _SPARSE_PARTS]
+        parts.append((offset, SparseDistances(*arrays, tuple(spec['shape']))))
+    if len(parts) == 1:
+        return parts[0][1]
+    return concat_trials(sorted(parts, key=lambda p: p[0]), trials)
+
+
+def load(path: PathLike, mmap_mode: str = 'r') -> Tuple[Observed, Latent, Dict[str, Any]]:
+    """Observed and Latent backed by memory maps of a store, with its metadata.
+
+    Nothing is read until an array is sliced, and then only the pages touched.
+    """
+    path = Path(path)
+    meta = json.loads((path/'meta.json').read_text())
+    if meta['format'] != FORMAT:
+        raise ValueError(f"Unsupported store format {meta['format']} in {path}")
+    groups = {group: cls() for group, cls in GROUPS.items()}
+    for name in meta['arrays']:
+        group, attr = name.split('/')
+        setattr(groups[group], attr, np.load(path/group/f'{attr}.npy', mmap_mode=mmap_mode))
+    for name, spec in meta['sparse'].items():
+        group, attr = name.split('/')
+        setattr(groups[group], attr, _load_sparse(path/group, attr, spec, meta['experiment']['trials'], mmap_mode))
+    return groups['observed'], groups['latent'], meta
@@ -0,0 +1,260 @@
+"""Grid and random parameter sweeps over ExperimentBuilder configs.
+
+A sweep starts from a base config::
+
+    {'timings': {...}, 'sensors': [sensor_config, ...], 'sources': [source_config, ...],
+     'dilution': {...}, 'background': {...}, 'experiment': {...}}
+
+where 'dilution' and 'background' override parameters of the experiment's models and
+'experiment' sets other Experiment fields. Axes are dotted paths into it, such as
+'dilution.strength', 'background.scale' or 'sensors.0.position_args.velocity'.
+
+Points are grouped by the values of axes that change the paths; each group builds one
+experiment and reuses its cached positions and distances for every point in it. Background
+loc/scale axes are not simulated per value at all: the standardised draws are shared and the
+values applied as an extra array dimension. Groups are spread across a process pool and every
+point is written to one sweep directory: a meta.json indexing the points and one store per
+point under points/<i>, since points can differ in layout (a cutoff axis makes the distances
+sparse). `open_sweep` reads them back, `stack` on a leading point axis, and `Sweep.check`
+compares stored points with standalone runs.
+"""
+import copy
+import itertools
+import json
+import multiprocessing
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import replace
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+import numpy as np
+
+import store
+from base import Dilution
+from builder import ExperimentBuilder
+from experiment import Experiment, Observed, Latent, _STAGE_INPUTS, _jsonable
+
+# Sections of a base config and the Experiment field each one sets
+SECTIONS = {'timings': None, 'sensors': 'positions', 'sources': 'positions',
+            'dilution': 'dilution', 'background': 'background', 'experiment': None}
+
+# Timing fields that change the shape of the outputs, so cannot vary within one store
+SHAPE_FIELDS = ('length', 'hz', 'trials', 'interval')
+
+# Background parameters applied after the draws, so sweepable as an array dimension
+VECTOR_PARAMS = ('loc', 'scale')
+
+def _field(axis: str) -> str:
+    """Experiment field an axis sets."""
+    section, _, rest = axis.partition('.')
+    if section not in SECTIONS or not rest:
+        raise ValueError(f"Axis must be '<section>.<key>' with section one of {tuple(SECTIONS)}, got {axis!r}")
+    name = SECTIONS[section] or rest.split('.')[0]
+    if name in SHAPE_FIELDS:
+        raise ValueError(f"Axis {axis!r} changes the output shapes; sweep it with separate stores")
+    return name
+
+def axis_stages(axis: str) -> Tuple[str, ...]:
+    """Pipeline stages invalidated by varying `axis`."""
+    name = _field(axis)
+    return tuple(stage for stage, inputs in _STAGE_INPUTS.items() if name in inputs)
+
+def _is_path_axis(axis: str) -> bool:
+    return 'positions' in axis_stages(axis)
+
+def _is_vector_axis(axis: str) -> bool:
+    section, _, key = axis.partition('.')
+    return section == 'background' and key in VECTOR_PARAMS
+
+def _set(config: Dict, axis: str, value: Any) -> None:
+    """Set a dotted path, indexing lists by integer keys."""
+    *parents, last = axis.split('.')
+    node = config
+    for key in parents:
+        node = node[int(key)] if isinstance(node, list) else node.setdefault(key, {})
+    if isinstance(node, list):
+        node[int(last)] = value
+    else:
+        node[last] = value
+
+def _value_key(values: Dict[str, Any], axes: Sequence[str]) -> str:
+    return json.dumps([_jsonable(values[a]) for a in axes])
+
+
+class Sweep:
+    """Points of a sweep over `base`, each a dict of axis -> value."""
+    def __init__(self, base: Dict[str, Any], points: List[Dict[str, Any]]):
+        self.base = copy.deepcopy(base)
+        self.base.setdefault('timings', {})
+        if self.base['timings'].get('seed') is None:
+            # every point draws from the same streams, so differences come from the axes alone
+            self.base['timings']['seed'] = np.random.SeedSequence().entropy
+        self.points = points
+        self.axes = list(dict.fromkeys(a for p in points for a in p))
+        for axis in self.axes:
+            _field(axis)
+
+    @classmethod
+    def grid(cls, base: Dict[str, Any], axes: Dict[str, Sequence]) -> 'Sweep':
+        names = list(axes)
+        return cls(base, [dict(zip(names, values)) for values in itertools.product(*axes.values())])
+
+    @classmethod
+    def random(cls, base: Dict[str, Any], axes: Dict[str, Union[Sequence, Tuple[float, float]]],
+               samples: int, seed: Optional[int] = None) -> 'Sweep':
+        """`samples` points, each axis drawn uniformly from a (low, high) tuple or from a list of values."""
+        rng = np.random.default_rng(seed)
+        draw = lambda v: rng.uniform(*v) if isinstance(v, tuple) else v[rng.integers(len(v))]
+        return cls(base, [{axis: draw(v) for axis, v in axes.items()} for _ in range(samples)])
+
+    def config(self, point: Dict[str, Any]) -> Dict[str, Any]:
+        config = copy.deepcopy(self.base)
+        for axis, value in point.items():
+            _set(config, axis, value)
+        return config
+
+    def plan(self) -> List[Dict[str, List[int]]]:
+        """Groups of points sharing paths, each mapping a scalar setting to the points vectorised over it."""
+        path_axes = [a for a in self.axes if _is_path_axis(a)]
+        scalar_axes = [a for a in self.axes if not _is_path_axis(a) and not _is_vector_axis(a)]
+        groups: Dict[str, Dict[str, List[int]]] = {}
+        for i, point in enumerate(self.points):
+            group = groups.setdefault(_value_key(point, path_axes), {})
+            group.setdefault(_value_key(point, scalar_axes), []).append(i)
+        return list(groups.values())
+
+    def run(self, path: Union[str, Path], workers: int = 1) -> None:
+        """Simulate every point into the store at `path`, one group of points per task."""
+        path = Path(path)
+        if path.exists():
+            shutil.rmtree(path)
+        (path/'points').mkdir(parents=True)
+        meta = {'format': store.FORMAT, 'base': _jsonable(self.base), 'axes': self.axes,
+                'points': [_jsonable(p) for p in self.points], 'done': []}
+        _write_meta(path, meta)
+        tasks = [[i for batch in group.values() for i in batch] for group in self.plan()]
+        tasks = [[(i, self.points[i]) for i in batch] for batch in tasks]
+        if workers > 1:
+            with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+                for done in pool.map(_run_group, itertools.repeat(self.base), tasks, itertools.repeat(str(path))):
+                    meta['done'].extend(done)
+                    _write_meta(path, meta)
+        else:
+            for task in tasks:
+                meta['done'].extend(_run_group(self.base, task, str(path)))
+                _write_meta(path, meta)
+
+    def check(self, path: Union[str, Path], points: Optional[Sequence[int]] = None) -> List[int]:
+        """Indexes of stored points (all by default) that differ from a standalone run of the point.
+
+        Each point is rebuilt and run on its own and compared on readings and expected values,
+        which checks the path sharing and background vectorisation `run` relies on.
+        """
+        results = open_sweep(path)
+        mismatched = []
+        for i in range(len(self.points)) if points is None else points:
+            exp = _build(self.config(self.points[i]))
+            exp.run()
+            observed, latent, _ = results[i]
+            rtol = 100*np.finfo(exp.dtype).eps
+            same = lambda a, b: np.allclose(a, b, rtol=rtol, atol=rtol*np.max(np.abs(b), initial=0))
+            if not (same(observed.readings, exp.observed.readings) and same(latent.ev_background, exp.latent.ev_background)
+                    and same(latent.ev_source, exp.latent.ev_source)):
+                mismatched.append(i)
+        return mismatched
+
+
+def _write_meta(path: Path, meta: Dict[str, Any]) -> None:
+    tmp = path/'meta.json.tmp'
+    tmp.write_text(json.dumps(meta, indent=1))
+    tmp.replace(path/'meta.json')
+
+def _build(config: Dict[str, Any], configure: bool = True) -> Experiment:
+    """Experiment of a point's config, with its model and field settings applied if `configure`."""
+    builder = ExperimentBuilder()
+    builder.add_timings(config.get('timings', {}))
+    for c in config.get('sensors', []):
+        builder.add_sensor_config(c)
+    for c in config.get('sources', []):
+        builder.add_source_config(c)
+    exp = builder.build_experiment()
+    if configure:
+        _configure(exp, config)
+    return exp
+
+def _changed(params: Dict[str, Any], current: Dict[str, Any]) -> bool:
+    """Whether model parameters differ, comparing array values (e.g. one per source) elementwise."""
+    return params.keys() != current.keys() or any(not np.array_equal(params[k], current[k]) for k in params)
+
+def _configure(exp: Experiment, config: Dict[str, Any], background: Optional[Dict[str, Any]] = None) -> None:
+    """Apply the model and field settings of `config`, reassigning only what changed."""
+    dilution = {**exp.dilution.params, **config.get('dilution', {})}
+    if _changed(dilution, exp.dilution.params):
+        exp.dilution = Dilution(exp.dilution.id, exp.dilution.func, dilution)
+    background = {**exp.background.params, **config.get('background', {}), **(background or {})}
+    if _changed(background, exp.background.params):
+        exp.background = replace(exp.background, params=background)
+    for name, value in config.get('experiment', {}).items():
+        if getattr(exp, name) != value:
+            setattr(exp, name, value)
+
+def _run_group(base: Dict[str, Any], points: List[Tuple[int, Dict[str, Any]]], path: str) -> List[int]:
+    """Simulate points sharing paths on one experiment and save each; returns their indexes."""
+    sweep = Sweep(base, [p for _, p in points])
+    exp = _build(sweep.config(points[0][1]), configure=False)
+    # the built background, which each point's overrides apply to before it is standardised
+    background = dict(exp.background.params)
+    batches: Dict[str, List[Tuple[int, Dict[str, Any]]]] = {}
+    scalar_axes = [a for a in sweep.axes if not _is_path_axis(a) and not _is_vector_axis(a)]
+    for i, point in points:
+        batches.setdefault(_value_key(point, scalar_axes), []).append((i, point))
+    for batch in batches.values():
+        config = sweep.config(batch[0][1])
+        # standardised background, to which each point's loc and scale are applied
+        _configure(exp, config, background={'loc': 0.0, 'scale': 1.0})
+        exp.run()
+        # background loc and scale of every point in the batch, on a leading point axis
+        params = [{**background, **sweep.config(point).get('background', {})} for _, point in batch]
+        loc = np.array([p.get('loc', 0.0) for p in params], dtype=exp.dtype)
+        scale = np.array([p.get('scale', 1.0) for p in params], dtype=exp.dtype)
+        signal_b = loc[:, None, None, None] + scale[:, None, None, None]*exp.latent.signal_b
+        readings = (signal_b + exp.latent.signal_s.sum(axis=1, dtype=np.float64)).astype(exp.dtype, copy=False)
+        for j, (i, _) in enumerate(batch):
+            result = copy.copy(exp)
+            # the point's own background in the stored meta; a cache of its own keeps the
+            # invalidation this triggers off exp's
+            result._cache = dict(exp._cache)
+            result.background = replace(exp.background, params=params[j])
+            result.observed = replace(exp.observed, readings=readings[j])
+            result.latent = replace(exp.latent, signal_b=signal_b[j], ev_background=loc[j] + scale[j]*exp.latent.ev_background)
+            store.save(result, Path(path)/'points'/str(i))
+    return [i for i, _ in points]
+
+
+class SweepResults:
+    """Memory-mapped results of a sweep, one (Observed, Latent, meta) per point."""
+    def __init__(self, path: Union[str, Path], mmap_mode: str = 'r'):
+        self.path = Path(path)
+        self.mmap_mode = mmap_mode
+        self.meta = json.loads((self.path/'meta.json').read_text())
+        self.points: List[Dict[str, Any]] = self.meta['points']
+
+    def __len__(self) -> int:
+        return len(self.points)
+
+    def __getitem__(self, i: int) -> Tuple[Observed, Latent, Dict[str, Any]]:
+        return store.load(self.path/'points'/str(i), self.mmap_mode)
+
+    def select(self, **values: Any) -> List[int]:
+        """Indexes of the points matching the given axis values, axes named with '__' for '.'."""
+        values = {k.replace('__', '.'): _jsonable(v) for k, v in values.items()}
+        return [i for i, p in enumerate(self.points) if all(p.get(k) == v for k, v in values.items())]
+
+    def stack(self, group: str, attr: str, points: Optional[Sequence[int]] = None) -> np.ndarray:
+        """One output of several points (all by default) stacked on a leading point axis."""
+        points = range(len(self)) if points is None else points
+        return np.stack([getattr(self[i][0 if group == 'observed' else 1], attr) for i in points])
+
+
+def open_sweep(path: Union[str, Path], mmap_mode: str = 'r') -> SweepResults:
+    return SweepResults(path, mmap_mode)
@@ -1 +1,2 @@
-
+# nosleep
+__version__ = '0.1.0'
@@ -1,11 +1,105 @@
 import numpy as np
-from typing import Callable, Protocol, runtime_checkable
+from typing import Any, Callable, Dict, Iterator, Optional, Protocol, Tuple, Union, runtime_checkable
+from utils.plugins import Registry
 
-def inv_sql(x:np.ndarray, strength:float = 1.0, scale:float = 1.0, tol:float = 1e-3) -> np.ndarray:
-    """Simple inverse square law function."""
-    d = np.where(x/scale < tol, tol, x/scale)
-    return strength/d**2
+# All attenuations are chains of in-place ufuncs: with `out` (which may be x itself) they
+# allocate little or nothing, without it mostly the result.
+#
+# Parameters broadcast against x, so the sources of an experiment can each have their own
+# strength, scale, ... and still be attenuated in one call (see `source_params`).
 
-def exponential(x:np.ndarray, strength:float = 1.0, scale:float = 1.0) -> np.ndarray:
+# Elements per chunk of the attenuations that need a temporary beside `out` (the absorption's
+# decay, np.interp's result), which bounds its size
+CHUNK = 1 << 16
+
+def _buffer(out: Optional[np.ndarray], x: Any, *params: Any) -> np.ndarray:
+    """`out`, or a new array in x's float precision that x and params broadcast into.
+
+    Scalar distances get a 0-d array, as ufuncs called on numbers return numbers, which the
+    in-place steps cannot write to.
+    """
+    if out is not None:
+        return out
+    return np.empty(np.broadcast_shapes(np.shape(x), *map(np.shape, params)), dtype=np.result_type(x, 0.0))
+
+def _chunks(*operands: Any) -> Iterator[Tuple[np.ndarray, ...]]:
+    """Matching 1-d chunks of at most CHUNK elements of the broadcast operands.
+
+    The first operand is written back: it must be an array as large as the broadcast.
+    """
+    flags = ['external_loop', 'buffered', 'zerosize_ok']
+    op_flags = [['readwrite']] + [['readonly']]*(len(operands) - 1)
+    with np.nditer(operands, flags=flags, op_flags=op_flags, buffersize=CHUNK) as it:
+        for chunk in it:
+            yield chunk if len(operands) > 1 else (chunk,)
+
+def _result(out: np.ndarray) -> Any:
+    """The attenuation in `out`, a number if it is 0-d (scalar distances) and the array otherwise."""
+    return out[()] if out.ndim == 0 else out
+
+def inv_sql(x:np.ndarray, strength:float = 1.0, scale:float = 1.0, tol:float = 1e-3, squared:bool = False,
+            out:Optional[np.ndarray] = None) -> np.ndarray:
+    """Simple inverse square law function, `squared` takes squared distances and skips the square."""
+    if squared:
+        out = np.divide(x, scale**2, out=_buffer(out, x, strength, scale, tol))
+        np.maximum(out, tol**2, out=out)
+    else:
+        out = np.divide(x, scale, out=_buffer(out, x, strength, scale, tol))
+        np.maximum(out, tol, out=out)
+        np.square(out, out=out)
+    return _result(np.divide(strength, out, out=out))
+
+def exponential(x:np.ndarray, strength:float = 1.0, scale:float = 1.0, out:Optional[np.ndarray] = None) -> np.ndarray:
     """Simple exponential decay function."""
-    return strength*np.exp(-x/scale)
\ No newline at end of file
+    out = np.divide(x, -scale, out=_buffer(out, x, strength, scale))
+    np.exp(out, out=out)
+    return _result(np.multiply(strength, out, out=out))
+
+def inv_sql_absorption(x:np.ndarray, strength:float = 1.0, scale:float = 1.0, absorption:float = 0.0,
+                       tol:float = 1e-3, out:Optional[np.ndarray] = None) -> np.ndarray:
+    """Inverse square law damped by absorption along the way, exp(-absorption*x)*inv_sql(x)."""
+    out = _buffer(out, x, strength, scale, absorption, tol)
+    for o, xc, k, c, mu, r0 in _chunks(out, x, strength, scale, absorption, tol):
+        decay = np.multiply(xc, -mu)
+        np.exp(decay, out=decay)
+        inv_sql(xc, k, c, r0, out=o)
+        np.multiply(o, decay, out=o)
+    return _result(out)
+
+def tabulated(x:np.ndarray, distances:np.ndarray, values:np.ndarray, strength:float = 1.0, scale:float = 1.0,
+              out:Optional[np.ndarray] = None) -> np.ndarray:
+    """Measured curve: values at `distances` (in units of scale) interpolated linearly, times strength.
+
+    The curve is flat beyond the ends of the table. All sources share the table; strength and
+    scale may still differ per source.
+    """
+    out = np.divide(x, scale, out=_buffer(out, x, strength, scale))
+    for (o,) in _chunks(out):
+        o[...] = np.interp(o, distances, values)
+    return _result(np.multiply(strength, out, out=out))
+
+# Attenuation models by name; packages add their own through `nosleep.attenuations` entry points
+ATTENUATIONS = Registry('attenuation', {'inv_sql': inv_sql, 'exponential': exponential,
+                                        'inv_sql_absorption': inv_sql_absorption, 'tabulated': tabulated},
+                        group='nosleep.attenuations')
+
+# Dimensions of each array attenuation parameter (tables, shared by all sources); any other
+# parameter is a scalar, or one value per source when given as a 1-d array
+PARAM_DIMS = {'distances': 1, 'values': 1}
+
+def source_params(params: Dict[str, Any], ndim: int, rows: Union[slice, np.ndarray, None] = None) -> Dict[str, Any]:
+    """params shaped to broadcast against (sources, ...) arrays of `ndim` dimensions.
+
+    A parameter with one dimension more than PARAM_DIMS gives it holds one value per source:
+    those values are taken at `rows` (a slice or index array of sources) if given, and get
+    trailing axes up to `ndim`. Other parameters are passed as they are.
+    """
+    shaped = {}
+    for name, value in params.items():
+        dims = PARAM_DIMS.get(name, 0)
+        if np.ndim(value) == dims + 1:
+            value = np.asarray(value)
+            value = value if rows is None else value[rows]
+            value = value.reshape(value.shape[:1] + (1,)*(ndim - 1) + value.shape[1:])
+        shaped[name] = value
+    return shaped
@@ -0,0 +1,134 @@
+import math
+import inspect
+import numpy as np
+from typing import Callable, Dict, Optional, Tuple, Union
+from utils.math import path_integral, rule_weights
+from utils.tiling import iter_distance_tiles, _lift, _time_block
+from utils.trajectory import Trajectory, window_blocks
+from utils.workspace import Workspace
+from utils.attenuation import inv_sql, exponential, inv_sql_absorption, source_params
+from utils.functional import call_plan
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+try:
+    import numexpr
+except ImportError:
+    numexpr = None
+
+# Working memory for the NumPy/numexpr path when no budget is given
+DEFAULT_BUDGET = 2**26
+
+# Attenuations the compiled and numexpr kernels know how to evaluate
+_KINDS = {inv_sql: 0, exponential: 1, inv_sql_absorption: 2}
+
+def _with_defaults(func: Callable, params: Dict) -> Dict:
+    """params completed with the defaults of func's parameters, other than its output buffer."""
+    defaults = {k: p.default for k, p in inspect.signature(func).parameters.items() if p.default is not p.empty and k != 'out'}
+    return {**defaults, **params}
+
+if numba is not None:
+    @numba.njit(parallel=True, cache=True)
+    def _dose_kernel(x, z, w, n, kind, strength, scale, tol, absorption, dose, dist):
+        sources, sensors = z.shape[0], x.shape[0]
+        for p in numba.prange(sources*sensors):
+            s, i = p // sensors, p % sensors
+            k, sc, r0, mu = strength[s], scale[s], tol[s], absorption[s]
+            for t in range(dose.shape[2]):
+                for b in range(dose.shape[3]):
+                    acc_a, acc_d = 0.0, 0.0
+                    for j in range(n + 1):
+                        d2 = 0.0
+                        for c in range(x.shape[3]):
+                            diff = x[i,t,b*n + j,c] - z[s,t,b*n + j,c]
+                            d2 += diff*diff
+                        d = math.sqrt(d2)
+                        if kind == 1:
+                            a = k*math.exp(-d/sc)
+                        else:
+                            r = max(d/sc, r0)
+                            a = k/(r*r)
+                            if kind == 2:
+                                a *= math.exp(-mu*d)
+                        acc_a += w[j]*a
+                        acc_d += w[j]*d
+                    dose[s,i,t,b] = acc_a/n
+                    dist[s,i,t,b] = acc_d/n
+
+def _numba_dose(kind: int, params: Dict, x: np.ndarray, z: np.ndarray, n: int, rule: str) -> Tuple[np.ndarray, np.ndarray]:
+    x, z, trials, steps = _lift(x, z)
+    lift = lambda a: np.broadcast_to(a if a.ndim == 4 else a[:,None], (a.shape[0], max(trials, 1)) + a.shape[-2:])
+    shape = (z.shape[0], x.shape[0], max(trials, 1), (steps - 1)//n)
+    dose, dist = np.empty(shape), np.empty(shape)
+    # one value per source of each parameter, whether it is shared or given per source
+    per_source = lambda name, default: np.ascontiguousarray(np.broadcast_to(np.asarray(params.get(name, default), dtype=np.float64), z.shape[:1]))
+    _dose_kernel(lift(x).astype(np.float64), lift(z).astype(np.float64), rule_weights(n, rule), n, kind,
+                 per_source('strength', 1.0), per_source('scale', 1.0), per_source('tol', 0.0), per_source('absorption', 0.0),
+                 dose, dist)
+    return (dose, dist) if trials else (dose[:,:,0], dist[:,:,0])
+
+def _blocked_numba_dose(kind: int, params: Dict, x: Trajectory, z: Trajectory, n: int, rule: str,
+                        budget: int) -> Tuple[np.ndarray, np.ndarray]:
+    """_numba_dose over time blocks of whole bins, pulling only each block's positions."""
+    lx, lz, trials, steps = _lift(x, z)
+    shape = (lz.shape[0], lx.shape[0]) + ((trials,) if trials else ()) + ((steps - 1)//n,)
+    dose, dist = np.empty(shape), np.empty(shape)
+    bytes_per_step = 8*max(trials, 1)*(lx.shape[0] + lz.shape[0])*lx.shape[-1]
+    for b, t in window_blocks(steps - 1, n, budget, bytes_per_step):
+        xb, zb = (_time_block(a, t) for a in (x, z))
+        dose[..., b], dist[..., b] = _numba_dose(kind, params, xb, zb, n, rule)
+    return dose, dist
+
+def _attenuate_squared(func: Callable, params: Dict, d2: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """func applied to a tile of squared distances, through numexpr when it can be, into `out` if given.
+
+    params are those of the tile's sources, already shaped by `source_params`.
+    """
+    kind = _KINDS.get(func)
+    if numexpr is not None and kind == 0:
+        return numexpr.evaluate('k/where(d2 < c, c, d2)', local_dict=dict(
+            d2=d2, k=params['strength']*params['scale']**2, c=(params['tol']*params['scale'])**2), out=out)
+    if numexpr is not None and kind == 1:
+        return numexpr.evaluate('strength*exp(-sqrt(d2)/scale)', local_dict=dict(
+            d2=d2, strength=params['strength'], scale=params['scale']), out=out)
+    if numexpr is not None and kind == 2:
+        return numexpr.evaluate('k*exp(-mu*sqrt(d2))/where(d2 < c, c, d2)', local_dict=dict(
+            d2=d2, k=params['strength']*params['scale']**2, c=(params['tol']*params['scale'])**2,
+            mu=params['absorption']), out=out)
+    if kind == 0:
+        return func(d2, **{**params, 'squared': True}, out=out)
+    if call_plan(func).accepts('out'):
+        return func(np.sqrt(d2, out=out), **params, out=out)
+    return func(np.sqrt(d2), **params)
+
+def fused_path_integral(func: Callable, params: Dict, x: Union[np.ndarray, Trajectory], z: Union[np.ndarray, Trajectory], n: int = 10,
+                        rule: str = 'trapezoid', budget: Optional[int] = None,
+                        workspace: Optional[Workspace] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Interval means of func(distance) and of distance, computed in one pass.
+
+    The attenuation is evaluated at every step and then integrated, so the mean reading is
+    unbiased, unlike attenuating the mean distance. Parameters may hold one value per source.
+    inv_sql, exponential and inv_sql_absorption run in a compiled Numba loop when Numba is
+    installed, over time blocks of at most `budget` bytes of positions when x or z is a
+    Trajectory. Otherwise the distances are walked in tiles of at most
+    `budget` bytes, attenuated with numexpr if available (plain NumPy if not) and reduced tile
+    by tile, the tiles and attenuated tiles living in `workspace` buffers when one is given.
+    Returns (dose, distance), each (sources, sensors, [trials,] bins).
+    """
+    params = _with_defaults(func, params)
+    if numba is not None and func in _KINDS:
+        if isinstance(x, Trajectory) or isinstance(z, Trajectory):
+            return _blocked_numba_dose(_KINDS[func], params, x, z, n, rule, budget or DEFAULT_BUDGET)
+        return _numba_dose(_KINDS[func], params, x, z, n, rule)
+    lx, lz, trials, steps = _lift(x, z)
+    shape = (lz.shape[0], lx.shape[0]) + ((trials,) if trials else ()) + ((steps - 1)//n,)
+    dose, dist = np.empty(shape), np.empty(shape)
+    # the attenuated tile is a third tile-sized array next to the distances and their scratch
+    for (s, k, b), d2 in iter_distance_tiles(x, z, budget or DEFAULT_BUDGET, n, squared=True, workspace=workspace, buffers=3):
+        out = None if workspace is None else workspace.get('attenuation', d2.shape, d2.dtype)
+        dose[s, k, ..., b] = path_integral(lambda a: a, _attenuate_squared(func, source_params(params, d2.ndim, s), d2, out), n, rule)
+        dist[s, k, ..., b] = path_integral(lambda a: a, np.sqrt(d2, out=d2), n, rule)
+    return dose, dist
@@ -1,17 +1,43 @@
 import numpy as np
-from numpy.lib.stride_tricks import sliding_window_view as swv
 from functools import partial
-from typing import Callable
+from typing import Callable, Optional
+from utils.workspace import Workspace
 
 def compute_distance(x: np.ndarray, z: np.ndarray) -> np.ndarray:
     """Computes the distance between x and z"""
     return np.linalg.norm(x - z, axis=-1)
 
-def compute_all_distances(x: np.ndarray, z: np.ndarray) -> np.ndarray:
-    """Computes the distance for all k x l sensor/source combinations."""
+def _pair_axes(x: np.ndarray, z: np.ndarray) -> tuple:
+    """Lift sensors x and sources z to broadcastable (1, k, ..., 2) and (l, 1, ..., 2) views."""
     x = x[None,...] if x.ndim == 2 else x
     z = z[None,...] if z.ndim == 2 else z
-    return np.array([compute_distance(x, z) for z in z])
+    nd = max(x.ndim, z.ndim)
+    x = x.reshape(x.shape[:1] + (1,)*(nd - x.ndim) + x.shape[1:])
+    z = z.reshape(z.shape[:1] + (1,)*(nd - z.ndim) + z.shape[1:])
+    return x[None], z[:,None]
+
+def compute_all_distances(x: np.ndarray, z: np.ndarray, out: np.ndarray = None,
+                          dtype: np.dtype = None, squared: bool = False, workspace: Optional[Workspace] = None) -> np.ndarray:
+    """Computes the distance for all k x l sensor/source combinations.
+
+    Sensors x are (k, [trials,] steps, d) and sources z are (l, [trials,] steps, d); the
+    result is (l, k, [trials,] steps), written into `out` when given. With `squared`
+    the sqrt is skipped and squared distances are returned. The scratch array of the
+    per-coordinate squares is taken from `workspace` when given.
+    """
+    x, z = _pair_axes(x, z)
+    shape = np.broadcast_shapes(x.shape, z.shape)[:-1]
+    dtype = out.dtype if out is not None else np.dtype(dtype if dtype is not None else np.result_type(x, z, np.float32))
+    out = np.empty(shape, dtype=dtype) if out is None else out
+    if x.shape[-1] > 1:
+        tmp = np.empty_like(out) if workspace is None else workspace.get('distance_scratch', out.shape, out.dtype)
+    np.subtract(x[...,0], z[...,0], out=out)
+    np.square(out, out=out)
+    for i in range(1, x.shape[-1]):
+        np.subtract(x[...,i], z[...,i], out=tmp)
+        np.square(tmp, out=tmp)
+        out += tmp
+    return out if squared else np.sqrt(out, out=out)
 
 def compute_gradient(x: np.ndarray) -> np.ndarray:
     return partial(np.gradient, axis=-1)(x)
@@ -24,6 +50,59 @@ def _slicer(arr: np.ndarray, n:int, axis: int) -> np.ndarray:
     slices[axis] = slice(None, None, n)  # Modify the slice for the specified axis
     return arr[tuple(slices)]
 
-def naive_path_integral(func: Callable, x: np.ndarray) -> np.ndarray:
+RULES = ('rectangle', 'trapezoid', 'simpson')
+
+def interval_steps(hz: float, interval: float) -> int:
+    """Number of sample steps in one integration interval of `interval` seconds."""
+    n = int(round(interval*hz))
+    if n < 1 or not np.isclose(n, interval*hz):
+        raise ValueError(f"Integration interval {interval}s is not a whole number of steps at {hz}Hz")
+    return n
+
+def rule_weights(n: int, rule: str = 'trapezoid') -> np.ndarray:
+    """Quadrature weights of the n+1 samples of one interval; the interval mean is (w*f).sum()/n."""
+    w = np.ones(n + 1)
+    if rule == 'rectangle':
+        w[-1] = 0.0
+    elif rule == 'trapezoid':
+        w[[0, -1]] = 0.5
+    elif rule == 'simpson':
+        if n % 2:
+            raise ValueError(f"Simpson's rule needs an even number of steps per interval, got {n}")
+        w[1:-1:2], w[2:-1:2], w[[0, -1]] = 4/3, 2/3, 1/3
+    else:
+        raise ValueError(f"Unknown integration rule: {rule}. Expected one of {RULES}")
+    return w
+
+def _bin_sums(x: np.ndarray, n: int, bins: int, start: int = 0, step: int = 1) -> np.ndarray:
+    """Sum of x[..., b*n + start : (b+1)*n : step] for every bin b, without a windowed view, accumulated in float64."""
+    return np.add.reduceat(x[...,start:bins*n:step], np.arange(0, bins*n//step, n//step), axis=-1, dtype=np.float64)
+
+def path_integral(func: Callable, x: np.ndarray, n: int, rule: str = 'trapezoid', axis: int = -1) -> np.ndarray:
+    """Mean of x over consecutive intervals of n steps, passed through func.
+
+    Interval b spans samples b*n..(b+1)*n along `axis`, giving (samples - 1)//n bins. The mean
+    follows `rule`: left 'rectangle', 'trapezoid' or composite 'simpson' (n must be even). It is
+    accumulated in float64 and returned in the precision of x (at least float32).
+    """
+    x = np.moveaxis(x, axis, -1)
+    dtype = np.result_type(x.dtype, np.float32)
+    bins = (x.shape[-1] - 1)//n
+    total = _bin_sums(x, n, bins)
+    if rule == 'rectangle':
+        mean = total/n
+    elif rule == 'trapezoid':
+        mean = (total + 0.5*(x[...,n:bins*n + 1:n] - x[...,0:bins*n:n]))/n
+    elif rule == 'simpson':
+        if n % 2:
+            raise ValueError(f"Simpson's rule needs an even number of steps per interval, got {n}")
+        odd = _bin_sums(x, n, bins, start=1, step=2)
+        mean = (2*total + 2*odd - x[...,0:bins*n:n] + x[...,n:bins*n + 1:n])/(3*n)
+    else:
+        raise ValueError(f"Unknown integration rule: {rule}. Expected one of {RULES}")
+    return np.moveaxis(func(mean.astype(dtype, copy=False)), -1, axis)
 
-    return func(swv(x, window_shape=11, axis=-1)[...,::10,:].mean(axis = -1))
\ No newline at end of file
+def naive_path_integral(func: Callable, x: np.ndarray, n: int = 10) -> np.ndarray:
+    """Mean of the n+1 samples closing each interval of n steps, passed through func."""
+    bins = (x.shape[-1] - 1)//n
+    return func((_bin_sums(x, n, bins) + x[...,n:bins*n + 1:n])/(n + 1))
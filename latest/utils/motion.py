@@ -1,17 +1,52 @@
 import numpy as np
-from itertools import repeat
+from typing import Optional, Sequence, Union
+from utils.plugins import Registry
+
+def _factor(sigma: np.ndarray) -> np.ndarray:
+    """Batched L with L @ L.T == sigma; eigendecomposition when sigma is only semi-definite."""
+    try:
+        return np.linalg.cholesky(sigma)
+    except np.linalg.LinAlgError:
+        w, v = np.linalg.eigh(sigma)
+        return v*np.sqrt(np.clip(w, 0, None))[...,None,:]
 
 def random_walk(start:np.ndarray,
                 mu: np.ndarray, 
                 sigma: np.ndarray, 
                 dt:float, 
                 steps:int,
-                trials:int) -> np.ndarray:
-    """Generate random walk paths based on multivariate normal distributions."""
-    path = np.zeros((len(mu),trials, steps+1, len(mu[0])))
-    path[:,:,0] = start[:,None,:]
-    path[:,:,1:] = dt*np.array([*map(np.random.multivariate_normal, mu, sigma, repeat((trials, steps)))])
-    return path.cumsum(axis=2)
+                trials:int,
+                rng: Union[np.random.Generator, Sequence[np.random.Generator], None] = None,
+                dtype: np.dtype = np.float64,
+                out: Optional[np.ndarray] = None) -> np.ndarray:
+    """Generate random walk paths based on multivariate normal distributions.
+
+    All covariances are factorised in one batch and a single standard-normal block is drawn
+    from `rng`, correlated with a batched matmul and cumulated in place into `out`. `rng` may
+    also be one Generator per trial, making each trial's path depend only on its own stream.
+    `start` may carry a separate (objects, trials, d) position per trial, e.g. to continue a walk.
+    Below float64 the walk is drawn and cumulated in float64 and rounded once at the end, so it
+    is the float64 walk of the same streams; RandomWalkTrajectory does the same block by block.
+    """
+    if np.dtype(dtype) != np.float64:
+        walk = random_walk(start, mu, sigma, dt, steps, trials, rng, np.float64)
+        if out is None:
+            return walk.astype(dtype)
+        out[...] = walk
+        return out
+    mu, sigma = np.asarray(mu, dtype=dtype), np.asarray(sigma, dtype=dtype)
+    path = np.empty((len(mu), trials, steps+1, mu.shape[-1]), dtype=dtype) if out is None else out
+    path[:,:,0] = start if start.ndim == 3 else start[:,None,:]
+    if rng is None or isinstance(rng, np.random.Generator):
+        eps = (rng or np.random.default_rng()).standard_normal(path[:,:,1:].shape, dtype=path.dtype)
+    else:
+        eps = np.empty(path[:,:,1:].shape, dtype=path.dtype)
+        for t, g in enumerate(rng):
+            eps[:,t] = g.standard_normal(eps[:,t].shape, dtype=path.dtype)
+    np.matmul(eps, _factor(sigma).swapaxes(-1, -2)[:,None], out=eps)
+    eps += mu[:,None,None,:]
+    np.multiply(eps, dt, out=path[:,:,1:])
+    return np.cumsum(path, axis=2, out=path)
     
 
 def elliptical(center:np.ndarray,
@@ -19,9 +54,16 @@ def elliptical(center:np.ndarray,
             a:np.ndarray,
             b:np.ndarray,
             phi:np.ndarray,
-            steps:int) -> np.ndarray:
-    """Generate elliptical paths with specified parameters."""
-    t = np.linspace(0, 2*np.pi*periods, steps+1)
+            steps:int,
+            at:Optional[np.ndarray] = None,
+            span:Optional[int] = None) -> np.ndarray:
+    """Generate elliptical paths with specified parameters.
+
+    `periods` are completed over `span` steps (default `steps`). With `at`, only the positions
+    at those step indices are returned.
+    """
+    at = np.arange(steps+1) if at is None else np.asarray(at)
+    t = 2*np.pi*np.asarray(periods)*at[:,None]/(span or steps)
     X = lambda t: a*np.cos(t)*np.cos(phi) - b*np.sin(t)*np.sin(phi)
     Y = lambda t: a*np.cos(t)*np.sin(phi) + b*np.sin(t)*np.cos(phi)
     return np.array([X(t),Y(t)]).T + center[:,None,:]
@@ -30,12 +72,20 @@ def linear(start:np.ndarray,
            velocity:np.ndarray,
            angle:float,
            dt:float,
-           steps:int) -> np.ndarray:
-     """Generate linear paths with constant velocity and direction."""
+           steps:int,
+           at:Optional[np.ndarray] = None) -> np.ndarray:
+     """Generate linear paths with constant velocity and direction, at step indices `at` if given."""
+     at = np.arange(steps+1) if at is None else np.asarray(at)
      v = (velocity*np.array([np.cos(angle), np.sin(angle)])*dt).T
-     return v[:,None,:]*np.arange(steps+1)[None,:,None] + start[:,None,:]
+     return v[:,None,:]*at[None,:,None] + start[:,None,:]
 
 def stationary(start:np.ndarray,
-               steps:int) -> np.ndarray:
-    """Generate stationary paths."""
-    return np.repeat(start[:,None,:], steps+1, axis=1)
+               steps:int,
+               at:Optional[np.ndarray] = None) -> np.ndarray:
+    """Generate stationary paths, at step indices `at` if given."""
+    return np.repeat(start[:,None,:], steps+1 if at is None else len(at), axis=1)
+
+# Motion models by name. No entry point group: ObjectTable stores motions as codes into
+# registry.MOTIONS, which only knows these.
+MOTION_MODELS = Registry('motion model', {'stationary': stationary, 'linear': linear,
+                                          'elliptical': elliptical, 'random_walk': random_walk})
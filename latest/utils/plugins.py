@@ -0,0 +1,68 @@
+from importlib.metadata import entry_points
+from typing import Callable, Dict, Iterator, Optional, Union
+
+def _key(name: str) -> str:
+    """Lookup key of a model name: case and underscores are ignored, so 'RandomWalk' is 'random_walk'."""
+    return name.replace('_', '').lower()
+
+class Registry:
+    """Named models of one kind, resolved by name from configs.
+
+    Built-in models are given on construction or added with `register` (also usable as a
+    decorator). When a `group` is given, packages extend the registry through entry points of
+    that group, e.g. in their pyproject.toml:
+
+        [project.entry-points."nosleep.attenuations"]
+        inverse_cube = "mypackage.models:inverse_cube"
+
+    Entry points are loaded on the first lookup of a name that is not registered, and
+    registered names take precedence over them.
+    """
+    def __init__(self, kind: str, models: Optional[Dict[str, Callable]] = None, group: Optional[str] = None):
+        self.kind, self.group = kind, group
+        self.models: Dict[str, Callable] = {}
+        self.names: Dict[str, str] = {}
+        self.loaded = group is None
+        for name, func in (models or {}).items():
+            self.register(name, func)
+
+    def register(self, name: str, func: Optional[Callable] = None) -> Callable:
+        """Add `func` under `name`; returns it, or a decorator doing so when func is not given."""
+        if func is None:
+            return lambda f: self.register(name, f)
+        self.models[_key(name)], self.names[_key(name)] = func, name
+        return func
+
+    def _load(self) -> None:
+        self.loaded = True
+        for ep in entry_points(group=self.group):
+            if _key(ep.name) not in self.models:
+                self.register(ep.name, ep.load())
+
+    def __getitem__(self, name: str) -> Callable:
+        if _key(name) not in self.models and not self.loaded:
+            self._load()
+        try:
+            return self.models[_key(name)]
+        except KeyError:
+            raise ValueError(f"Unknown {self.kind}: {name!r}; expected one of {sorted(self)}") from None
+
+    def __contains__(self, name: str) -> bool:
+        try:
+            self[name]
+        except ValueError:
+            return False
+        return True
+
+    def __iter__(self) -> Iterator[str]:
+        if not self.loaded:
+            self._load()
+        return iter(list(self.names.values()))
+
+    def resolve(self, model: Union[str, Callable]) -> Callable:
+        """The model registered under `model`, or `model` itself if it already is one."""
+        return self[model] if isinstance(model, str) else model
+
+    def name_of(self, func: Callable) -> Optional[str]:
+        """Name `func` is registered under, if any."""
+        return next((self.names[k] for k, f in self.models.items() if f is func), None)
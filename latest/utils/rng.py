@@ -0,0 +1,46 @@
+import zlib
+import numpy as np
+from dataclasses import dataclass
+from typing import Any, List, Optional, Sequence
+
+def _key(value: Any) -> int:
+    """Stable integer for a spawn-key component; strings hash the same in every process."""
+    if value is None:
+        return 0
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    return zlib.crc32(str(value).encode())
+
+def _index(value: Any) -> int:
+    """Spawn-key component of an optional index: 0 for None and i + 1 for index i, so index 0
+    and no index draw different streams."""
+    if value is None:
+        return 0
+    if not isinstance(value, (int, np.integer)):
+        return _key(value)
+    if value < 0:
+        raise ValueError(f"Stream indices must be non-negative, got {value}")
+    return int(value) + 1
+
+@dataclass(frozen=True)
+class Seeds:
+    """SeedSequence hierarchy keyed by (experiment, stage, object, trial).
+
+    Every stream is derived from the root entropy and its key alone, so any trial can be
+    regenerated on any worker without replaying the others. An object key may be a tuple of
+    components, e.g. (role, object id, block), each a component of the spawn key.
+    """
+    entropy: int
+    experiment: Any = None
+
+    def sequence(self, stage: str, obj: Any = None, trial: Optional[int] = None) -> np.random.SeedSequence:
+        obj = tuple(map(_index, obj)) if isinstance(obj, tuple) else (_index(obj),)
+        key = (_key(self.experiment), _key(stage)) + obj + (_index(trial),)
+        return np.random.SeedSequence(self.entropy, spawn_key=key)
+
+    def rng(self, stage: str, obj: Any = None, trial: Optional[int] = None) -> np.random.Generator:
+        return np.random.default_rng(self.sequence(stage, obj, trial))
+
+    def trial_rngs(self, stage: str, trials: Sequence[int], obj: Any = None) -> List[np.random.Generator]:
+        """One Generator per (global) trial index."""
+        return [self.rng(stage, obj, t) for t in trials]
@@ -0,0 +1,89 @@
+import numpy as np
+from numpy.typing import NDArray
+from dataclasses import dataclass
+from typing import Callable, List, Tuple
+from scipy.spatial import cKDTree
+from scipy.sparse import csr_matrix
+from utils.math import rule_weights
+
+@dataclass
+class SparseDistances:
+    """COO distances for the sensor/source pairs within a cutoff radius.
+
+    `step` indexes the flattened ([trials,] steps) axes of `shape`, which is the dense
+    (sources, sensors, [trials,] steps) layout of compute_all_distances.
+    """
+    source: NDArray
+    sensor: NDArray
+    step: NDArray
+    data: NDArray
+    shape: Tuple[int, ...]
+
+    def map(self, func: Callable[[NDArray], NDArray]) -> 'SparseDistances':
+        """Apply an elementwise function (e.g. an attenuation) to the stored distances."""
+        return SparseDistances(self.source, self.sensor, self.step, func(self.data), self.shape)
+
+    def tocsr(self) -> csr_matrix:
+        """(sources*sensors, [trials*]steps) CSR matrix of the stored values."""
+        rows = self.source*self.shape[1] + self.sensor
+        return csr_matrix((self.data, (rows, self.step)), shape=(self.shape[0]*self.shape[1], int(np.prod(self.shape[2:]))))
+
+    def todense(self, fill: float = 0.0) -> NDArray:
+        out = np.full(self.shape, fill, dtype=self.data.dtype)
+        out.reshape(self.shape[:2] + (-1,))[self.source, self.sensor, self.step] = self.data
+        return out
+
+def concat_trials(parts: List[Tuple[int, SparseDistances]], trials: int) -> SparseDistances:
+    """Join sparse distances of consecutive trial chunks, given as (first trial, chunk) pairs."""
+    steps = parts[0][1].shape[-1]
+    join = lambda attr: np.concatenate([getattr(sd, attr) for _, sd in parts])
+    step = np.concatenate([sd.step + offset*steps for offset, sd in parts])
+    return SparseDistances(join('source'), join('sensor'), step, join('data'), parts[0][1].shape[:2] + (trials, steps))
+
+def _spacetime(p: np.ndarray, trials: int, spacing: float) -> np.ndarray:
+    """(objects, points, d+1) positions with the flattened time index appended as a coordinate."""
+    p = p[None,...] if p.ndim == 2 else p
+    if trials and p.ndim == 3:
+        p = np.broadcast_to(p[:,None], (p.shape[0], trials) + p.shape[1:])
+    p = p.reshape(p.shape[0], -1, p.shape[-1])
+    t = np.broadcast_to(spacing*np.arange(p.shape[1])[None,:,None], p.shape[:2] + (1,))
+    return np.concatenate([p, t], axis=-1)
+
+def pairs_within(x: np.ndarray, z: np.ndarray, cutoff: float) -> SparseDistances:
+    """Sensor/source distances no greater than `cutoff`, found with one KD-tree query.
+
+    Time is embedded as an extra coordinate spaced further apart than the cutoff, so only
+    pairs at the same step can fall within range and every step is answered at once.
+    """
+    trials = max([a.shape[1] for a in (x, z) if a.ndim == 4], default=0)
+    spacing = 2.0*cutoff + 1.0
+    xs, zs = _spacetime(x, trials, spacing), _spacetime(z, trials, spacing)
+    points = xs.shape[1]
+    found = cKDTree(zs.reshape(-1, zs.shape[-1])).sparse_distance_matrix(
+        cKDTree(xs.reshape(-1, xs.shape[-1])), cutoff, output_type='ndarray')
+    source, step = np.divmod(found['i'], points)
+    sensor = found['j']//points
+    # canonical (source, sensor, step) order, so results do not depend on the tree's traversal
+    order = np.lexsort((step, sensor, source))
+    shape = (zs.shape[0], xs.shape[0]) + ((trials,) if trials else ()) + (max(x.shape[-2], z.shape[-2]),)
+    return SparseDistances(source[order], sensor[order], step[order], found['v'][order], shape)
+
+def sparse_path_integral(func: Callable, sd: SparseDistances, n: int = 10, rule: str = 'trapezoid') -> np.ndarray:
+    """Interval mean of func(distance) into dense (sources, sensors, [trials,] bins) readings.
+
+    Pairs outside the cutoff contribute zero, so `func` should be an attenuation that is
+    negligible beyond it.
+    """
+    steps = sd.shape[-1]
+    bins = (steps - 1)//n
+    shape = sd.shape[:-1] + (bins,)
+    w = rule_weights(n, rule)/n
+    trial, step = np.divmod(sd.step, steps)
+    values = func(sd.data)
+    row = ((sd.source*sd.shape[1] + sd.sensor)*(int(np.prod(sd.shape[2:-1]))) + trial)*bins
+    b, offset = np.divmod(step, n)
+    # every sample weighs into its own interval, and interval boundaries also close the previous one
+    out = np.bincount((row + b)[b < bins], weights=(values*w[offset])[b < bins], minlength=int(np.prod(shape)))
+    edge = (offset == 0) & (b > 0)
+    out += np.bincount((row + b - 1)[edge], weights=values[edge]*w[-1], minlength=out.size)
+    return out.reshape(shape)
@@ -0,0 +1,72 @@
+import numpy as np
+from typing import Callable, Iterator, Optional, Tuple, Union
+from utils.math import compute_all_distances, path_integral
+from utils.trajectory import Trajectory
+from utils.workspace import Workspace
+
+def tile_shape(sources: int, sensors: int, bins: int, bytes_per_bin: int, budget: int) -> Tuple[int, int, int]:
+    """Largest (source, sensor, bin) block whose distance tile fits in `budget` bytes.
+
+    Halves the longest block axis until the tile fits; a single pair and bin is the floor.
+    """
+    block = [sources, sensors, bins]
+    while block[0]*block[1]*block[2]*bytes_per_bin > budget and max(block) > 1:
+        i = int(np.argmax(block))
+        block[i] = (block[i] + 1)//2
+    return tuple(block)
+
+def _lift(x: np.ndarray, z: np.ndarray) -> Tuple[np.ndarray, np.ndarray, int, int]:
+    x = x[None,...] if x.ndim == 2 else x
+    z = z[None,...] if z.ndim == 2 else z
+    trials = max([a.shape[1] for a in (x, z) if a.ndim == 4], default=0)
+    return x, z, trials, max(x.shape[-2], z.shape[-2])
+
+def _time_block(x: Union[np.ndarray, Trajectory], t: slice) -> np.ndarray:
+    """Steps t of a path, pulled from a Trajectory without building the rest."""
+    return x.window(t.start, t.stop) if isinstance(x, Trajectory) else x[...,t,:]
+
+def iter_distance_tiles(x: Union[np.ndarray, Trajectory], z: Union[np.ndarray, Trajectory], budget: int, n: int = 10, dtype: np.dtype = np.float64,
+                        squared: bool = False, workspace: Optional[Workspace] = None,
+                        buffers: int = 2) -> Iterator[Tuple[Tuple[slice, slice, slice], np.ndarray]]:
+    """Walk the (sources, sensors, [trials,] steps) distance tensor in memory-bounded tiles.
+
+    Time blocks are aligned to the integration intervals of n steps, so each tile holds the
+    samples for a whole number of output bins; x and z may be Trajectory objects, of which only
+    the current time block is evaluated. Yields ((source, sensor, bin) slices, distance tile); the
+    tile is a view into a reused buffer and is only valid until the next iteration. With
+    `squared` the tiles hold squared distances. The buffer and its scratch come from `workspace`
+    when given, so repeated walks reuse them. Tiles are sized so that `buffers` tile-sized arrays
+    (the distances, their scratch and any the caller keeps per tile) fit in `budget`.
+    """
+    x, z, trials, steps = _lift(x, z)
+    bins = (steps - 1)//n
+    bytes_per_bin = buffers*np.dtype(dtype).itemsize*max(trials, 1)*n
+    sb, kb, tb = tile_shape(z.shape[0], x.shape[0], bins, bytes_per_bin, budget)
+    tile = (sb, kb) + ((trials,) if trials else ()) + (n*tb + 1,)
+    buf = np.empty(tile, dtype=dtype) if workspace is None else workspace.get('distance_tiles', tile, dtype)
+    for b0 in range(0, bins, tb):
+        b = slice(b0, min(b0 + tb, bins))
+        t = slice(n*b.start, n*b.stop + 1)
+        xt, zt = (_time_block(a, t) for a in (x, z))
+        for s0 in range(0, z.shape[0], sb):
+            for k0 in range(0, x.shape[0], kb):
+                s, k = slice(s0, s0 + sb), slice(k0, k0 + kb)
+                xs, zs = xt[k], zt[s]
+                out = buf[:zs.shape[0], :xs.shape[0], ..., :t.stop - t.start]
+                yield (s, k, b), compute_all_distances(xs, zs, out=out, squared=squared, workspace=workspace)
+
+def tiled_path_integral(func: Callable, x: Union[np.ndarray, Trajectory], z: Union[np.ndarray, Trajectory], budget: int, n: int = 10,
+                        rule: str = 'trapezoid', dtype: np.dtype = np.float64, workspace: Optional[Workspace] = None) -> np.ndarray:
+    """Windowed path integral of the sensor/source distances without materialising the full tensor.
+
+    Each distance tile is averaged over its intervals with path_integral and passed through `func` (e.g. an attenuation)
+    before being written to the (sources, sensors, [trials,] bins) result.
+    """
+    lx, lz, trials, steps = _lift(x, z)
+    shape = (lz.shape[0], lx.shape[0]) + ((trials,) if trials else ()) + ((steps - 1)//n,)
+    result = None
+    for (s, k, b), tile in iter_distance_tiles(x, z, budget, n, dtype, workspace=workspace):
+        value = path_integral(func, tile, n, rule)
+        result = np.empty(shape, dtype=value.dtype) if result is None else result
+        result[s, k, ..., b] = value
+    return result
@@ -0,0 +1,138 @@
+import numpy as np
+from abc import ABC, abstractmethod
+from functools import partial
+from numpy.typing import NDArray
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple
+from utils.functional import call_plan
+from utils.motion import _factor
+
+# Steps between the stored positions of a random walk
+CHECKPOINT_STEPS = 256
+
+class Trajectory(ABC):
+    """Positions of a set of objects over steps 0..steps, evaluated only where asked for.
+
+    `at(t)` returns the positions at step indices t and `window(start, stop)` those of steps
+    start <= t < stop, each shaped (objects, [trials,] len(t), d) like the full path, which
+    np.asarray materialises.
+    """
+    shape: Tuple[int, ...]
+
+    @property
+    def ndim(self) -> int:
+        return len(self.shape)
+
+    @property
+    def steps(self) -> int:
+        return self.shape[-2] - 1
+
+    @abstractmethod
+    def at(self, t: Sequence[int]) -> NDArray:
+        ...
+
+    def window(self, start: int, stop: int) -> NDArray:
+        return self.at(np.arange(start, stop))
+
+    def __array__(self, dtype: Optional[np.dtype] = None, copy: Optional[bool] = None) -> NDArray:
+        path = self.window(0, self.steps + 1)
+        return path if dtype is None else path.astype(dtype)
+
+
+class ArrayTrajectory(Trajectory):
+    """Trajectory over an already materialised path."""
+    def __init__(self, path: NDArray):
+        self.path = path
+        self.shape, self.dtype = path.shape, path.dtype
+
+    def at(self, t: Sequence[int]) -> NDArray:
+        return self.path[..., np.asarray(t), :]
+
+    def window(self, start: int, stop: int) -> NDArray:
+        return self.path[..., start:stop, :]
+
+
+class AnalyticTrajectory(Trajectory):
+    """Closed-form motion (`linear`, `stationary`, `elliptical`) evaluated at any step from its formula."""
+    def __init__(self, func: Callable[..., NDArray], params: Dict[str, Any], context: Dict[str, Any]):
+        self.func, self.params = func, params
+        self.dtype = np.dtype(context.get('dtype', np.float64))
+        # the context and parameters are fixed, so filter them once rather than on every query
+        plan = call_plan(func)
+        self.bound, self.takes_at = plan.bind({**context, **params}), plan.accepts('at')
+        first = self.at([0])
+        self.shape = first.shape[:-2] + (context['steps'] + 1, first.shape[-1])
+
+    def at(self, t: Sequence[int]) -> NDArray:
+        path = self.bound(at=np.asarray(t)) if self.takes_at else self.bound()
+        return path.astype(self.dtype, copy=False)
+
+
+def _fresh_rngs(entropy: int, objects: int, trials: int, j: int) -> Sequence[Sequence[np.random.Generator]]:
+    return [[np.random.default_rng(np.random.SeedSequence(entropy, spawn_key=(i, j, t))) for t in range(trials)]
+            for i in range(objects)]
+
+class RandomWalkTrajectory(Trajectory):
+    """Random walk stored as its positions every `every` steps.
+
+    The increments of checkpoint block j are drawn from `rngs(j)`, for every object one Generator
+    per trial (fresh entropy if not given), so each object's walk depends on its own streams
+    alone and any block can be regenerated on its own: a query redraws
+    only the blocks it touches and cumulates them from the preceding checkpoint, which is
+    recorded the first time the walk gets past it. Memory is O(steps/every) per walk.
+    Draws, checkpoints and sums stay in float64; positions are returned in `dtype`.
+    """
+    def __init__(self, start: NDArray, mu: NDArray, sigma: NDArray, dt: float, steps: int, trials: int,
+                 rngs: Optional[Callable[[int], Sequence[np.random.Generator]]] = None,
+                 every: int = CHECKPOINT_STEPS, dtype: np.dtype = np.float64):
+        self.dtype = np.dtype(dtype)
+        self.mu, self.factor = np.asarray(mu, dtype=np.float64), _factor(np.asarray(sigma, dtype=np.float64)).swapaxes(-1, -2)
+        if rngs is None or rngs(0) is None:
+            rngs = partial(_fresh_rngs, np.random.SeedSequence().entropy, len(self.mu), trials)
+        self.dt, self.trials, self.rngs, self.every = dt, trials, rngs, every
+        self.shape = (len(self.mu), trials, steps + 1, self.mu.shape[-1])
+        blocks = -(-steps//every)
+        self.checkpoints = np.empty((len(self.mu), trials, blocks + 1, self.mu.shape[-1]))
+        start = np.asarray(start, dtype=np.float64)
+        self.checkpoints[:,:,0] = start if start.ndim == 3 else start[:,None,:]
+        self.known = 1
+
+    def _increments(self, j: int) -> NDArray:
+        """(objects, trials, steps in block j, d) increments of checkpoint block j."""
+        n = min(self.every, self.steps - j*self.every)
+        eps = np.empty(self.shape[:2] + (n, self.shape[-1]), dtype=self.checkpoints.dtype)
+        for i, streams in enumerate(self.rngs(j)):
+            for t, g in enumerate(streams):
+                eps[i,t] = g.standard_normal(eps.shape[2:], dtype=eps.dtype)
+        np.matmul(eps, self.factor[:,None], out=eps)
+        eps += self.mu[:,None,None,:]
+        eps *= self.dt
+        return eps
+
+    def _block(self, j: int) -> NDArray:
+        """Positions of the steps in checkpoint block j, recording checkpoint j+1 on first use."""
+        while self.known <= j:
+            self._block(self.known - 1)
+        path = np.cumsum(self._increments(j), axis=2)
+        path += self.checkpoints[:,:,j,None]
+        if self.known == j + 1:
+            self.checkpoints[:,:,j+1] = path[:,:,-1]
+            self.known += 1
+        return path
+
+    def at(self, t: Sequence[int]) -> NDArray:
+        t = np.asarray(t)
+        out = np.empty(self.shape[:2] + (len(t), self.shape[-1]), dtype=self.dtype)
+        out[:,:,t == 0] = self.checkpoints[:,:,:1]
+        block = (t - 1)//self.every
+        for j in np.unique(block[t > 0]):
+            sel = (block == j) & (t > 0)
+            out[:,:,sel] = self._block(j)[:,:,t[sel] - j*self.every - 1]
+        return out
+
+
+def window_blocks(steps: int, n: int, budget: int, bytes_per_step: int) -> Sequence[Tuple[slice, slice]]:
+    """(bin slice, step slice) of consecutive time blocks of whole n-step bins within `budget` bytes."""
+    bins = steps//n
+    per_block = max(1, budget//max(1, bytes_per_step*n))
+    return [(slice(b0, min(b0 + per_block, bins)), slice(n*b0, n*min(b0 + per_block, bins) + 1))
+            for b0 in range(0, bins, per_block)]
@@ -0,0 +1,34 @@
+import numpy as np
+from numpy.typing import NDArray
+from typing import Any, Dict, Tuple
+
+class Workspace:
+    """Named scratch arrays reused from call to call.
+
+    `get(name, shape, dtype)` returns an uninitialised array backed by the buffer kept under
+    (name, dtype), reallocated only when a larger one is asked for, so kernels called once per
+    tile, chunk or trial stop allocating after the first call. Buffers live until `clear`, which
+    Experiment calls once each pipeline stage is computed: scratch is reused within a stage and
+    allocated afresh by the next. Two arrays alive at the same time need different names.
+    Buffers are not pickled, so a workspace travels to worker processes empty.
+    """
+    def __init__(self):
+        self.buffers: Dict[Tuple[str, np.dtype], NDArray] = {}
+
+    def get(self, name: str, shape: Tuple[int, ...], dtype: Any = np.float64) -> NDArray:
+        dtype = np.dtype(dtype)
+        size = int(np.prod(shape))
+        buf = self.buffers.get((name, dtype))
+        if buf is None or buf.size < size:
+            buf = self.buffers[(name, dtype)] = np.empty(size, dtype=dtype)
+        return buf[:size].reshape(shape)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(b.nbytes for b in self.buffers.values())
+
+    def clear(self) -> None:
+        self.buffers.clear()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        return {'buffers': {}}
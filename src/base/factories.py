@@ -5,9 +5,10 @@ from base.experiment import Experiment
 from base.field import FieldObjectProtocol, SourceProtocol, SensorProtocol, Source, Sensor # Import concrete classes
 from base.attenuation import AttenuatorProtocol, create_attenuator, AttenParamsProtocol # Assuming create_attenuator is in base/attenuation.py
 from base.distribution import DistributionProtocol # Assuming DistributionProtocol is in base/distribution.py - adjust if needed
-from utils.motion import linear, stationary, elliptical # Import motion functions from utils
-from utils.attenuation import inv_sql, exponential # Import attenuation functions from utils
-from utils.functional import f_kwargs
+from utils.motion import stationary, MOTION_MODELS # Import motion functions from utils
+from utils.attenuation import ATTENUATIONS # Import attenuation functions from utils
+from utils.plugins import Registry
+from utils.functional import call_plan
 from scipy import stats # Import scipy.stats for distributions
 from base.experiment_setup import ExperimentSetup # Import ExperimentSetup dataclass
 from base.pathing import PathArr # Import PathArr dataclass
@@ -25,21 +26,16 @@ def create_experiment(exp_dict: Dict) -> Experiment:
     return Experiment(duration=duration, hz=hz, trials=trials)
 
 
+# Distributions by name
+DISTRIBUTIONS = Registry('distribution', {'norm': stats.norm}) # For scipy.stats.norm (normal distribution)
+
 # Function to resolve function names (strings) to actual functions
 def resolve_function(func_name: str) -> Callable:
-    """Resolves a function name string to a function object."""
-    function_map = { # Expand this map as needed
-        'linear': linear,
-        'elliptical': elliptical, # Placeholder for elliptical
-        'stationary': stationary,
-        'inv_sql': inv_sql,
-        'exponential': exponential,
-        'norm': stats.norm # For scipy.stats.norm (normal distribution)
-    }
-    func = function_map.get(func_name)
-    if not func:
-        raise ValueError(f"Unknown function name: {func_name}")
-    return func
+    """Resolves a function name string to a function object, from the motion, attenuation and distribution registries."""
+    for registry in (MOTION_MODELS, ATTENUATIONS, DISTRIBUTIONS):
+        if func_name in registry:
+            return registry[func_name]
+    raise ValueError(f"Unknown function name: {func_name}")
 
 
 def create_paths(exp: Experiment, obj_dicts: List[Dict]) -> PathArr:
@@ -55,9 +51,10 @@ def create_paths(exp: Experiment, obj_dicts: List[Dict]) -> PathArr:
         motion_function = resolve_function(motion_func_name) if motion_func_name else stationary # Default to stationary
 
         paths_list: List[np.ndarray] = []
+        combined_params = {**motion_params_dict, 'steps': exp.steps, 'dt': exp.dt} # Pass dt here!
+        motion_call = call_plan(motion_function).bind(combined_params) # Signature resolved once per object, not per count
         for _ in range(count):
-            combined_params = {**motion_params_dict, 'steps': exp.steps, 'dt': exp.dt}
-            path = f_kwargs(motion_function, combined_params) # Pass dt here!
+            path = motion_call()
             paths_list.append(path)
 
         if 'atten' in obj_dict or 'dist' in obj_dict: # Heuristic to identify sources
@@ -100,18 +97,18 @@ def create_experiment_setup(exp_dict: Dict, obj_dicts: List[Dict]) -> Experiment
         dist_params_dict = obj_dict.get('dist_params', {}) # Not used yet
         distribution_function = resolve_function(dist_func_name) if dist_func_name else None
 
+        attenuator = None
+        if atten_function: # One attenuator shared by the object's sources, not one partial each
+            class DictAttenParams: # Simple class to mimic AttenParamsProtocol from a dict
+                def __init__(self, params):
+                    for k, v in params.items():
+                        setattr(self, k, v)
+            atten_params = DictAttenParams(atten_params_dict) # Create parameter object from dict
+            attenuator = create_attenuator(atten_params, atten_function)
+
         for _ in range(count): # No path assignment here anymore
-            attenuator = None
             distribution = None
 
-            if atten_function:
-                class DictAttenParams: # Simple class to mimic AttenParamsProtocol from a dict
-                    def __init__(self, params):
-                        for k, v in params.items():
-                            setattr(self, k, v)
-                atten_params = DictAttenParams(atten_params_dict) # Create parameter object from dict
-                attenuator = create_attenuator(atten_params, atten_function)
-
             if distribution_function:
                 distribution = distribution_function # Placeholder
 
@@ -128,4 +125,4 @@ def create_experiment_setup(exp_dict: Dict, obj_dicts: List[Dict]) -> Experiment
         sources=sources,
         sensors=sensors,
         paths=path_arr # PathArr object is still returned
-    )
\ No newline at end of file
+    )
\ No newline at end of file
@@ -1,5 +1,6 @@
 import numpy as np
 from typing import Callable, Protocol, runtime_checkable
+from utils.plugins import Registry
 
 def inv_sql(x:np.ndarray, strength:float = 1.0, scale:float = 1.0, tol:float = 1e-3) -> np.ndarray:
     """Simple inverse square law function."""
@@ -8,4 +9,7 @@ def inv_sql(x:np.ndarray, strength:float = 1.0, scale:float = 1.0, tol:float = 1
 
 def exponential(x:np.ndarray, strength:float = 1.0, scale:float = 1.0) -> np.ndarray:
     """Simple exponential decay function."""
-    return strength*np.exp(-x/scale)
\ No newline at end of file
+    return strength*np.exp(-x/scale)
+
+# Attenuation models by name; packages add their own through `nosleep.attenuations` entry points
+ATTENUATIONS = Registry('attenuation', {'inv_sql': inv_sql, 'exponential': exponential}, group='nosleep.attenuations')
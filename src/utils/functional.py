@@ -1,15 +1,76 @@
 import inspect
-from functools import reduce
-from typing import Callable, Any, Dict
+import weakref
+from functools import partial, reduce
+from typing import Callable, Any, Dict, Tuple
 
 def compose(*functions:Callable) -> Callable:
     """Left to right function composition."""
     return reduce(lambda f, g: lambda x: g(f(x)), functions, lambda x: x)
 
 
+# Parameters of the callables introspected so far, dropped with the callables themselves
+_PARAMETERS: 'weakref.WeakKeyDictionary[Callable, Tuple[Tuple[str, inspect._ParameterKind], ...]]' = weakref.WeakKeyDictionary()
+
+def _parameters(func:Callable) -> Tuple[Tuple[str, inspect._ParameterKind], ...]:
+    """(name, kind) of each parameter of a callable, introspected once while the callable lives.
+
+    Callables that are unhashable or cannot be weakly referenced are introspected every time.
+    """
+    try:
+        return _PARAMETERS[func]
+    except KeyError:
+        params = _PARAMETERS[func] = tuple((n, p.kind) for n, p in inspect.signature(func).parameters.items())
+        return params
+    except TypeError:
+        return tuple((n, p.kind) for n, p in inspect.signature(func).parameters.items())
+
+def _names(func:Callable) -> Tuple[str, ...]:
+    """Parameter names of `func`, a partial resolved through the signature of the function it wraps."""
+    target = func.func if isinstance(func, partial) else func
+    params = _parameters(target)
+    if isinstance(func, partial):
+        # the leading parameters filled positionally by the partial can no longer be passed
+        filled = len(func.args)
+        params = [(n, k) for i, (n, k) in enumerate(params) if i >= filled or k > inspect.Parameter.POSITIONAL_OR_KEYWORD]
+    return tuple(n for n, _ in params)
+
+
+class CallPlan:
+    """A callable with its accepted parameter names resolved once.
+
+    Calling the plan with a dict calls `func` with only the entries it accepts, looking up its
+    few names in the dict rather than filtering the whole dict; `bind` fixes those entries once
+    for repeated calls.
+    """
+    __slots__ = ('func', 'names')
+
+    def __init__(self, func:Callable, names:Tuple[str, ...]):
+        self.func = func
+        self.names = names
+
+    def accepts(self, name:str) -> bool:
+        return name in self.names
+
+    def kwargs(self, arg_dict:Dict[str, Any]) -> Dict[str, Any]:
+        """The entries of `arg_dict` that `func` accepts."""
+        return {k: arg_dict[k] for k in self.names if k in arg_dict}
+
+    def bind(self, arg_dict:Dict[str, Any]) -> Callable:
+        """`func` with the entries of `arg_dict` it accepts fixed, for the remaining arguments."""
+        return partial(self.func, **self.kwargs(arg_dict))
+
+    def __call__(self, arg_dict:Dict[str, Any]) -> Any:
+        return self.func(**self.kwargs(arg_dict))
+
+    def __reduce__(self):
+        return call_plan, (self.func,)
+
+
+def call_plan(func:Callable) -> CallPlan:
+    """Plan for calling `func` with dicts of arguments; the signature behind it is inspected once per function."""
+    return CallPlan(func, _names(func))
+
+
 def f_kwargs(func:Callable, arg_dict:Dict[str, Any]) -> Any:
     """Calls a function with a dictionary of arguments, filtering out any that are not valid for the function."""
-    sig = inspect.signature(func)
-    valid_args = set(sig.parameters)
-    filtered_dict = {k: v for k, v in arg_dict.items() if k in valid_args}
-    return func(**filtered_dict)
\ No newline at end of file
+    return call_plan(func)(arg_dict)
@@ -1,5 +1,6 @@
 import numpy as np
 from itertools import repeat
+from utils.plugins import Registry
 
 def random_walk(start:np.ndarray,
                 mu: np.ndarray, 
@@ -39,3 +40,7 @@ def stationary(start:np.ndarray,
                  steps:int) -> np.ndarray:
     """Generate stationary paths."""
     return np.repeat(start[:,None,:], steps+1, axis=1)
+
+# Motion models by name
+MOTION_MODELS = Registry('motion model', {'stationary': stationary, 'linear': linear, 'elliptical': elliptical,
+                                          'random_walk': random_walk})